@@ -1,24 +1,127 @@
 import os
+import random
+import asyncio
 import httpx
+from email.utils import parsedate_to_datetime
+from datetime import datetime, timezone
+from typing import Optional
 from dotenv import load_dotenv
 
 load_dotenv()
 GROQ_API_KEY = os.getenv("GROQ_API_KEY")
 MODEL_NAME = "meta-llama/llama-4-scout-17b-16e-instruct"
-GROQ_URL = "https://api.groq.com/openai/v1/chat/completions"
+GROQ_URL = os.getenv("GROQ_URL", "https://api.groq.com/openai/v1/chat/completions")
 
-async def get_script(prompt: str):
+# Connection pool and timeouts for the shared client
+GROQ_MAX_CONNECTIONS = int(os.getenv("GROQ_MAX_CONNECTIONS", "20"))
+GROQ_MAX_KEEPALIVE = int(os.getenv("GROQ_MAX_KEEPALIVE", "10"))
+GROQ_KEEPALIVE_EXPIRY = float(os.getenv("GROQ_KEEPALIVE_EXPIRY", "30"))
+GROQ_HTTP2 = os.getenv("GROQ_HTTP2", "").lower() in ("1", "true", "yes")
+GROQ_CONNECT_TIMEOUT = float(os.getenv("GROQ_CONNECT_TIMEOUT", "5"))
+GROQ_READ_TIMEOUT = float(os.getenv("GROQ_READ_TIMEOUT", "120"))
+GROQ_POOL_TIMEOUT = float(os.getenv("GROQ_POOL_TIMEOUT", "10"))
+
+# Retries on 429/5xx and transport errors, with jittered exponential backoff
+GROQ_MAX_RETRIES = int(os.getenv("GROQ_MAX_RETRIES", "3"))
+GROQ_BACKOFF_BASE = float(os.getenv("GROQ_BACKOFF_BASE", "0.5"))
+GROQ_BACKOFF_MAX = float(os.getenv("GROQ_BACKOFF_MAX", "20"))
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+
+_client: Optional[httpx.AsyncClient] = None
+
+
+def start_client() -> httpx.AsyncClient:
+    """Create the shared keep-alive client (called from the app lifespan)"""
+    global _client
+    if _client is None:
+        http2 = GROQ_HTTP2
+        if http2:
+            try:
+                import h2  # noqa: F401
+            except ImportError:
+                print("GROQ_HTTP2 is set but the h2 package is missing; using HTTP/1.1")
+                http2 = False
+        _client = httpx.AsyncClient(
+            http2=http2,
+            timeout=httpx.Timeout(
+                connect=GROQ_CONNECT_TIMEOUT,
+                read=GROQ_READ_TIMEOUT,
+                write=GROQ_CONNECT_TIMEOUT,
+                pool=GROQ_POOL_TIMEOUT
+            ),
+            limits=httpx.Limits(
+                max_connections=GROQ_MAX_CONNECTIONS,
+                max_keepalive_connections=GROQ_MAX_KEEPALIVE,
+                keepalive_expiry=GROQ_KEEPALIVE_EXPIRY
+            )
+        )
+    return _client
+
+
+async def close_client():
+    """Close the shared client and its pooled connections"""
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+
+def _retry_delay(attempt: int, response: Optional[httpx.Response] = None) -> float:
+    """Seconds to wait before retry number `attempt` (0-based), honoring Retry-After"""
+    if response is not None:
+        retry_after = response.headers.get("Retry-After")
+        if retry_after:
+            try:
+                return min(float(retry_after), GROQ_BACKOFF_MAX)
+            except ValueError:
+                try:
+                    retry_at = parsedate_to_datetime(retry_after)
+                    delay = (retry_at - datetime.now(timezone.utc)).total_seconds()
+                    return min(max(delay, 0.0), GROQ_BACKOFF_MAX)
+                except (TypeError, ValueError):
+                    pass
+    # Full jitter: uniform between 0 and the capped exponential step
+    return random.uniform(0, min(GROQ_BACKOFF_MAX, GROQ_BACKOFF_BASE * (2 ** attempt)))
+
+
+async def _send(payload: dict) -> httpx.Response:
+    """
+    POST a chat-completions payload through the shared client, retrying on
+    429/5xx responses and transport errors.
+    """
+    client = start_client()
     headers = {
         "Authorization": f"Bearer {GROQ_API_KEY}",
         "Content-Type": "application/json"
     }
+    request = client.build_request("POST", GROQ_URL, json=payload, headers=headers)
+    for attempt in range(GROQ_MAX_RETRIES + 1):
+        try:
+            response = await client.send(request)
+        except httpx.TransportError:
+            if attempt == GROQ_MAX_RETRIES:
+                raise
+            await asyncio.sleep(_retry_delay(attempt))
+            continue
+
+        if response.status_code not in RETRY_STATUS_CODES or attempt == GROQ_MAX_RETRIES:
+            if response.is_error:
+                await response.aread()
+                await response.aclose()
+            response.raise_for_status()
+            return response
+
+        await response.aclose()
+        await asyncio.sleep(_retry_delay(attempt, response))
+
+
+async def get_script(prompt: str):
     payload = {
         "model": MODEL_NAME,
         "messages": [{"role": "user", "content": prompt}],
         "temperature": 0.7
     }
 
-    async with httpx.AsyncClient() as client:
-        response = await client.post(GROQ_URL, json=payload, headers=headers)
-        response.raise_for_status()
-        return response.json()["choices"][0]["message"]["content"]
+    response = await _send(payload)
+    return response.json()["choices"][0]["message"]["content"]
+
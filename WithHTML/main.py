@@ -2,11 +2,21 @@ from fastapi import FastAPI, Request, Form
 from fastapi.responses import HTMLResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
-from groq_client import get_script
+from groq_client import get_script, start_client, close_client
 from prompts import build_prompt
 from models import ScriptRequest
+from contextlib import asynccontextmanager
 
-app = FastAPI()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Open the pooled Groq client on startup and close it on shutdown"""
+    start_client()
+    yield
+    await close_client()
+
+
+app = FastAPI(lifespan=lifespan)
 
 # Mount static and template folders
 app.mount("/static", StaticFiles(directory="static"), name="static")
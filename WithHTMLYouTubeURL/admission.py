@@ -0,0 +1,264 @@
+import os
+import time
+import uuid
+import asyncio
+import hashlib
+import sqlite3
+import threading
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from typing import AsyncIterator, Dict, Optional, Tuple
+from metrics import ADMISSION_SHED, ADMISSION_WAIT
+
+
+class Overloaded(Exception):
+    """Raised instead of queueing a request that can't be served in time (503) or exceeds its client's share (429)"""
+
+    def __init__(self, message: str, status_code: int, retry_after: int):
+        super().__init__(message)
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+
+# Client the current request is admitted for; None means admission control doesn't apply
+admission_client: ContextVar[Optional[str]] = ContextVar("admission_client", default=None)
+
+
+def client_id(headers, host: Optional[str], trust_forwarded: bool = False) -> str:
+    """Identify a client by API key (hashed, never stored in clear) or else by IP address"""
+    api_key = headers.get("x-api-key")
+    authorization = headers.get("authorization", "")
+    if not api_key and authorization.lower().startswith("bearer "):
+        api_key = authorization[7:]
+    if api_key:
+        return "key:" + hashlib.sha256(api_key.encode("utf-8")).hexdigest()[:16]
+    forwarded = headers.get("x-forwarded-for") if trust_forwarded else None
+    return "ip:" + (forwarded.split(",")[0].strip() if forwarded else host or "unknown")
+
+
+def _alive(pid: int) -> bool:
+    """Whether a process with this pid exists on this host"""
+    if pid <= 0:
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class AdmissionController:
+    """
+    Concurrency limits per upstream ("pool"), with a bounded FIFO wait queue and a
+    per-client cap, kept in SQLite so every uvicorn worker using the same db_path
+    shares them (None keeps them in memory, per process).
+
+    A request holds a slot in a pool while it calls that upstream. When the pool
+    is full it waits in line for up to queue_timeout seconds. It is shed at once
+    with a 503 if max_queue requests are already waiting, or with a 429 if its
+    client already holds or waits for per_client slots in the pool.
+
+    Extra concurrent calls made for a request that already holds a slot (fan-out)
+    take slots with fanout=True: they count against the pool's limit but not the
+    client's share or max_queue, so an admitted request is never shed for them.
+
+    Rows record the worker's pid: rows of workers that have died are reclaimed
+    at once, waiters older than queue_timeout are dropped, and running slots are
+    reclaimed after lease seconds in any case. Database calls run in a thread so
+    a lock held by another worker never stalls the event loop, and waiters poll
+    with backoff from poll_interval up to max_poll_interval.
+    """
+
+    # Extra seconds before a waiting row past queue_timeout counts as orphaned
+    WAITING_SLACK = 5
+
+    def __init__(self, limits: Dict[str, int], db_path: Optional[str] = None, per_client: int = 4,
+                 max_queue: int = 100, queue_timeout: float = 10, lease: float = 300, poll_interval: float = 0.05,
+                 max_poll_interval: float = 0.5):
+        self.limits = limits
+        self.per_client = per_client
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.lease = lease
+        self.poll_interval = poll_interval
+        self.max_poll_interval = max_poll_interval
+        self._pid = os.getpid()
+        self._lock = threading.Lock()
+        # Wakes this worker's waiters as soon as one of its slots is released
+        self._released: Dict[str, asyncio.Event] = {}
+        self._conn = sqlite3.connect(db_path or ":memory:", timeout=10, isolation_level=None,
+                                     check_same_thread=False)
+        if db_path:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS admission (token TEXT PRIMARY KEY, pool TEXT NOT NULL, "
+            "client TEXT NOT NULL, state TEXT NOT NULL, since REAL NOT NULL, pid INTEGER NOT NULL DEFAULT 0)"
+        )
+        columns = [row[1] for row in self._conn.execute("PRAGMA table_info(admission)")]
+        if "pid" not in columns:
+            self._conn.execute("ALTER TABLE admission ADD COLUMN pid INTEGER NOT NULL DEFAULT 0")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS admission_pool ON admission (pool, state, since)")
+
+    def _transaction(self, fn):
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                result = fn()
+                self._conn.execute("COMMIT")
+                return result
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def _purge(self, now: float):
+        """Delete rows of dead workers, waiters past their timeout and running slots past the lease"""
+        self._conn.execute("DELETE FROM admission WHERE state = 'running' AND since < ?", (now - self.lease,))
+        self._conn.execute("DELETE FROM admission WHERE state = 'waiting' AND since < ?",
+                           (now - self.queue_timeout - self.WAITING_SLACK,))
+        pids = [row[0] for row in self._conn.execute("SELECT DISTINCT pid FROM admission WHERE pid != ?",
+                                                     (self._pid,))]
+        dead = [pid for pid in pids if not _alive(pid)]
+        if dead:
+            self._conn.executemany("DELETE FROM admission WHERE pid = ?", [(pid,) for pid in dead])
+
+    def _enqueue(self, pool: str, client: str, fanout: bool = False) -> str:
+        """Add a waiter for the pool, or raise Overloaded if the queue or the client's share is full"""
+        token = uuid.uuid4().hex
+        now = time.time()
+
+        def enqueue():
+            self._purge(now)
+            if fanout:
+                # Stored under another name so the client's share doesn't count it
+                self._conn.execute("INSERT INTO admission (token, pool, client, state, since, pid) "
+                                   "VALUES (?, ?, ?, 'waiting', ?, ?)",
+                                   (token, pool, "fanout:" + client, now, self._pid))
+                return None
+            waiting, mine = self._conn.execute(
+                "SELECT SUM(state = 'waiting'), SUM(client = ?) FROM admission WHERE pool = ?", (client, pool)
+            ).fetchone()
+            if (mine or 0) >= self.per_client:
+                return "client"
+            if (waiting or 0) >= self.max_queue:
+                return "queue_full"
+            self._conn.execute("INSERT INTO admission (token, pool, client, state, since, pid) "
+                               "VALUES (?, ?, ?, 'waiting', ?, ?)", (token, pool, client, now, self._pid))
+            return None
+
+        reason = self._transaction(enqueue)
+        if reason == "client":
+            ADMISSION_SHED.inc(pool, "client_limit")
+            raise Overloaded(f"Too many concurrent requests from this client (limit {self.per_client})", 429,
+                             max(1, int(self.queue_timeout)))
+        if reason == "queue_full":
+            ADMISSION_SHED.inc(pool, "queue_full")
+            raise Overloaded("Server is busy, please retry shortly", 503, max(1, int(self.queue_timeout)))
+        return token
+
+    def _try_start(self, pool: str, token: str) -> bool:
+        """Turn the waiter into a running slot if the pool has room and it is first in line"""
+
+        def start():
+            self._purge(time.time())
+            running = self._conn.execute(
+                "SELECT COUNT(*) FROM admission WHERE pool = ? AND state = 'running'", (pool,)
+            ).fetchone()[0]
+            if running >= self.limits.get(pool, 1):
+                return False
+            first = self._conn.execute(
+                "SELECT token FROM admission WHERE pool = ? AND state = 'waiting' ORDER BY since, token LIMIT 1",
+                (pool,)
+            ).fetchone()
+            if not first or first[0] != token:
+                return False
+            self._conn.execute("UPDATE admission SET state = 'running', since = ? WHERE token = ?",
+                               (time.time(), token))
+            return True
+
+        return self._transaction(start)
+
+    def _remove(self, token: str):
+        with self._lock:
+            self._conn.execute("DELETE FROM admission WHERE token = ?", (token,))
+
+    async def _discard(self, token: str):
+        """Delete a row in a thread, finishing even if the calling task is cancelled meanwhile"""
+        await asyncio.shield(asyncio.to_thread(self._remove, token))
+
+    async def acquire(self, pool: str, fanout: bool = False) -> Optional[str]:
+        """
+        Wait for a slot in the pool for the current admission_client and return its
+        token (None when admission control doesn't apply). Raises Overloaded if the
+        request is shed or the queue timeout passes.
+        """
+        client = admission_client.get()
+        if client is None or pool not in self.limits:
+            return None
+
+        started = time.monotonic()
+        token = await asyncio.to_thread(self._enqueue, pool, client, fanout)
+        released = self._released.setdefault(pool, asyncio.Event())
+        poll_interval = self.poll_interval
+        try:
+            while not await asyncio.to_thread(self._try_start, pool, token):
+                remaining = self.queue_timeout - (time.monotonic() - started)
+                if remaining <= 0:
+                    ADMISSION_SHED.inc(pool, "queue_timeout")
+                    raise Overloaded("Server is busy, please retry shortly", 503, max(1, int(self.queue_timeout)))
+                # Woken by local releases; slots freed by other workers are found by polling
+                released.clear()
+                try:
+                    await asyncio.wait_for(released.wait(), min(poll_interval, remaining))
+                    poll_interval = self.poll_interval
+                except asyncio.TimeoutError:
+                    poll_interval = min(poll_interval * 2, self.max_poll_interval)
+        except BaseException:
+            await self._discard(token)
+            raise
+        ADMISSION_WAIT.observe(pool, value=time.monotonic() - started)
+        return token
+
+    async def release(self, pool: str, token: Optional[str]):
+        """Free a slot returned by acquire"""
+        if token is None:
+            return
+        event = self._released.get(pool)
+        try:
+            await self._discard(token)
+        finally:
+            if event is not None:
+                event.set()
+
+    @asynccontextmanager
+    async def slot(self, pool: str, fanout: bool = False) -> AsyncIterator[None]:
+        """Hold a slot in the pool for the duration of the block"""
+        token = await self.acquire(pool, fanout)
+        try:
+            yield
+        finally:
+            await self.release(pool, token)
+
+    def depths(self) -> Dict[Tuple[str, str], int]:
+        """(pool, state) -> number of waiting and running requests across all workers"""
+        with self._lock:
+            rows = self._conn.execute("SELECT pool, state, COUNT(*) FROM admission GROUP BY pool, state").fetchall()
+        depths = {(pool, state): 0 for pool in self.limits for state in ("waiting", "running")}
+        depths.update({(pool, state): count for pool, state, count in rows})
+        return depths
+
+    def stats(self):
+        depths = self.depths()
+        return {
+            pool: {
+                "limit": limit,
+                "running": depths.get((pool, "running"), 0),
+                "waiting": depths.get((pool, "waiting"), 0),
+                "max_queue": self.max_queue,
+                "per_client": self.per_client,
+                "shed": {reason: ADMISSION_SHED.value(pool, reason)
+                         for reason in ("client_limit", "queue_full", "queue_timeout")}
+            }
+            for pool, limit in self.limits.items()
+        }
@@ -0,0 +1,273 @@
+"""
+Local stand-ins for the Groq chat-completions API and the YouTube Data API v3
+endpoints used by youtube_client.py, for offline benchmarking.
+
+Run with:  uvicorn bench.fake_upstreams:app --port 9000
+
+Point the app at it with
+    GROQ_URL=http://127.0.0.1:9000/openai/v1/chat/completions
+    YOUTUBE_API_URL=http://127.0.0.1:9000/youtube/v3
+
+Behaviour is configured through the environment:
+    FAKE_LATENCY_MS          base latency added to every upstream call (default 50)
+    FAKE_JITTER_MS           uniform random extra latency (default 20)
+    FAKE_ERROR_RATE          fraction of calls answered with FAKE_ERROR_STATUS (default 0)
+    FAKE_ERROR_STATUS        status used for injected errors (default 503)
+    FAKE_SLOW_RATE           fraction of Groq calls that stall for FAKE_SLOW_MS first (default 0)
+    FAKE_SLOW_MS             extra latency of stalled calls, a tail-latency spike (default 2000)
+    FAKE_VIDEOS_PER_CHANNEL  uploads per fake channel (default 200)
+    FAKE_SCRIPT_WORDS        words in a script whose prompt asks for no length (default 600)
+    FAKE_OVERRUN             replies are this many times the length the prompt asks for (default 1)
+    FAKE_STREAM_CHUNKS       content deltas per streamed completion (default 50)
+    FAKE_TOKENS_PER_SECOND   if set, completions also take 1.3 tokens per word at this rate,
+                             so longer outputs take longer, like a real model (default 0: off)
+
+channels and playlistItems responses carry an etag and answer If-None-Match
+with a 304, like the real API.
+
+Fake channels are UCbench0000000000000000 ... UCbench9999999999999999 (any
+"UCbench" ID exists); anything else is "not found". GET /_stats returns call
+counts per endpoint and POST /_reset clears them.
+
+Completions honour max_tokens (finish_reason "length"), and a follow-up asking
+to continue a cut-off reply gets the rest of it.
+"""
+import os
+import json
+import re
+import random
+import asyncio
+import hashlib
+from collections import Counter
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+
+LATENCY_MS = float(os.getenv("FAKE_LATENCY_MS", "50"))
+JITTER_MS = float(os.getenv("FAKE_JITTER_MS", "20"))
+ERROR_RATE = float(os.getenv("FAKE_ERROR_RATE", "0"))
+ERROR_STATUS = int(os.getenv("FAKE_ERROR_STATUS", "503"))
+VIDEOS_PER_CHANNEL = int(os.getenv("FAKE_VIDEOS_PER_CHANNEL", "200"))
+SCRIPT_WORDS = int(os.getenv("FAKE_SCRIPT_WORDS", "600"))
+OVERRUN = float(os.getenv("FAKE_OVERRUN", "1"))
+STREAM_CHUNKS = int(os.getenv("FAKE_STREAM_CHUNKS", "50"))
+TOKENS_PER_SECOND = float(os.getenv("FAKE_TOKENS_PER_SECOND", "0"))
+SLOW_RATE = float(os.getenv("FAKE_SLOW_RATE", "0"))
+SLOW_MS = float(os.getenv("FAKE_SLOW_MS", "2000"))
+
+CHANNEL_PREFIX = "UCbench"
+WORDS = ("learn guide tips fun laugh story journey review versus business strategy vlog chill "
+         "amazing shocking life meaning science history the a and of to with our this").split()
+
+app = FastAPI()
+calls = Counter()
+
+
+def _seeded(*parts) -> random.Random:
+    """Deterministic RNG so the same channel/video always looks the same"""
+    return random.Random(hashlib.md5("/".join(map(str, parts)).encode()).hexdigest())
+
+
+def _text(rng: random.Random, words: int) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(words))
+
+
+def _conditional(request: Request, body: dict):
+    """Add an etag to a list response, and answer 304 if the client already has it"""
+    body["etag"] = hashlib.md5(json.dumps(body, sort_keys=True).encode()).hexdigest()
+    if request.headers.get("if-none-match") == body["etag"]:
+        calls["not_modified"] += 1
+        return Response(status_code=304)
+    return body
+
+
+async def _upstream(name: str):
+    """Count the call, wait the configured latency, and maybe inject an error"""
+    calls[name] += 1
+    await asyncio.sleep((LATENCY_MS + random.uniform(0, JITTER_MS)) / 1000)
+    if ERROR_RATE and random.random() < ERROR_RATE:
+        calls[f"{name}:error"] += 1
+        headers = {"Retry-After": "0"} if ERROR_STATUS == 429 else {}
+        return JSONResponse({"error": {"code": ERROR_STATUS, "message": "injected error"}},
+                            status_code=ERROR_STATUS, headers=headers)
+    return None
+
+
+@app.get("/_stats")
+async def stats():
+    return dict(calls)
+
+
+@app.post("/_reset")
+async def reset():
+    calls.clear()
+    return {}
+
+
+@app.post("/openai/v1/chat/completions")
+async def chat_completions(request: Request):
+    error = await _upstream("groq")
+    if error:
+        return error
+    if SLOW_RATE and random.random() < SLOW_RATE:
+        calls["groq:slow"] += 1
+        await asyncio.sleep(SLOW_MS / 1000)
+    body = await request.json()
+    messages = body["messages"]
+    prompt = messages[0]["content"]
+    rng = _seeded(prompt, len(messages))
+    # Prompts may ask for a length ("about N words"); a continuation gets what is left
+    requested = re.search(r"about (\d+) words", prompt)
+    words = int((int(requested.group(1)) if requested else SCRIPT_WORDS) * OVERRUN)
+    words -= sum(len(message["content"].split()) for message in messages if message["role"] == "assistant")
+    words = max(1, words)
+    if "Reply with JSON only" in prompt:
+        script = json.dumps({
+            "structure": "0:00 Hook\n0:30 Chapter 1\n3:00 Chapter 2\n6:00 Chapter 3\n9:00 Engagement",
+            "hook": _text(rng, 12),
+            "chapters": [{"title": _text(rng, 4), "summary": _text(rng, 20)} for _ in range(3)],
+            "engagement": _text(rng, 12)
+        })
+    else:
+        script = _text(rng, words)
+        if len(messages) > 1:
+            script = " " + script
+    finish_reason = "stop"
+    if body.get("max_tokens") and len(script.split()) * 13 // 10 > body["max_tokens"]:
+        script = " ".join(script.split(" ")[:body["max_tokens"] * 10 // 13 + (len(messages) > 1)])
+        finish_reason = "length"
+    completion_tokens = len(script.split()) * 13 // 10
+    usage = {"prompt_tokens": sum(len(message["content"]) for message in messages) // 4,
+             "completion_tokens": completion_tokens}
+    if TOKENS_PER_SECOND and not body.get("stream"):
+        await asyncio.sleep(completion_tokens / TOKENS_PER_SECOND)
+
+    if not body.get("stream"):
+        return {
+            "id": "fake", "object": "chat.completion", "model": body.get("model"),
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": script},
+                         "finish_reason": finish_reason}],
+            "usage": usage
+        }
+
+    async def chunks():
+        words = script.split(" ")
+        step = max(1, len(words) // STREAM_CHUNKS)
+        for start in range(0, len(words), step):
+            delta = " ".join(words[start:start + step]) + " "
+            chunk = {"choices": [{"index": 0, "delta": {"content": delta}, "finish_reason": None}]}
+            yield f"data: {json.dumps(chunk)}\n\n"
+            if TOKENS_PER_SECOND:
+                await asyncio.sleep(len(delta.split()) * 1.3 / TOKENS_PER_SECOND)
+            else:
+                await asyncio.sleep(LATENCY_MS / 1000 / STREAM_CHUNKS)
+        last = {"choices": [{"index": 0, "delta": {}, "finish_reason": finish_reason}], "x_groq": {"usage": usage}}
+        yield f"data: {json.dumps(last)}\n\n"
+        yield "data: [DONE]\n\n"
+
+    return StreamingResponse(chunks(), media_type="text/event-stream")
+
+
+def _channel(channel_id: str) -> dict:
+    rng = _seeded(channel_id)
+    return {
+        "kind": "youtube#channel",
+        "etag": hashlib.md5(channel_id.encode()).hexdigest(),
+        "id": channel_id,
+        "snippet": {
+            "title": f"Bench channel {channel_id[-4:]}",
+            "description": _text(rng, 80),
+            "customUrl": f"@bench{channel_id[-6:]}".lower(),
+            "publishedAt": "2015-01-01T00:00:00Z"
+        },
+        "statistics": {
+            "viewCount": str(rng.randint(10 ** 4, 10 ** 8)),
+            "subscriberCount": str(rng.randint(10 ** 3, 10 ** 7)),
+            "videoCount": str(VIDEOS_PER_CHANNEL)
+        },
+        "brandingSettings": {"channel": {"keywords": _text(rng, 10)}},
+        "contentDetails": {"relatedPlaylists": {"uploads": "UU" + channel_id[2:]}}
+    }
+
+
+def _video_id(channel_suffix: str, index: int) -> str:
+    return hashlib.md5(f"{channel_suffix}/{index}".encode()).hexdigest()[:11]
+
+
+@app.get("/youtube/v3/channels")
+async def channels(request: Request):
+    error = await _upstream("youtube:channels")
+    if error:
+        return error
+    params = request.query_params
+    ids = []
+    if params.get("id"):
+        ids = [channel_id for channel_id in params["id"].split(",") if channel_id.startswith(CHANNEL_PREFIX)]
+    elif params.get("forHandle") or params.get("forUsername"):
+        name = (params.get("forHandle") or params.get("forUsername")).lstrip("@")
+        if name.lower().startswith("bench"):
+            ids = [CHANNEL_PREFIX + name[5:].rjust(17, "0")[-17:]]
+    return _conditional(request, {"kind": "youtube#channelListResponse",
+                                  "items": [_channel(channel_id) for channel_id in ids]})
+
+
+@app.get("/youtube/v3/playlistItems")
+async def playlist_items(request: Request):
+    error = await _upstream("youtube:playlistItems")
+    if error:
+        return error
+    params = request.query_params
+    playlist_id = params.get("playlistId", "")
+    if not playlist_id.startswith("UU" + CHANNEL_PREFIX[2:]):
+        return JSONResponse({"error": {"code": 404, "message": "playlistNotFound"}}, status_code=404)
+
+    max_results = min(int(params.get("maxResults", 5)), 50)
+    start = int(params.get("pageToken") or 0)
+    end = min(start + max_results, VIDEOS_PER_CHANNEL)
+    items = [{
+        "contentDetails": {
+            "videoId": _video_id(playlist_id[2:], index),
+            # Newest first, one upload a day
+            "videoPublishedAt": f"2024-{12 - (index // 28) % 12:02d}-{28 - index % 28:02d}T12:00:00Z"
+        }
+    } for index in range(start, end)]
+    response = {"kind": "youtube#playlistItemListResponse", "items": items}
+    if end < VIDEOS_PER_CHANNEL:
+        response["nextPageToken"] = str(end)
+    return _conditional(request, response)
+
+
+@app.get("/youtube/v3/videos")
+async def videos(request: Request):
+    error = await _upstream("youtube:videos")
+    if error:
+        return error
+    ids = [video_id for video_id in request.query_params.get("id", "").split(",") if video_id][:50]
+    items = []
+    for video_id in ids:
+        rng = _seeded(video_id)
+        items.append({
+            "id": video_id,
+            "snippet": {
+                "title": _text(rng, 8),
+                "description": _text(rng, 150),
+                "publishedAt": "2024-06-01T12:00:00Z"
+            },
+            "statistics": {
+                "viewCount": str(rng.randint(100, 10 ** 6)),
+                "likeCount": str(rng.randint(0, 10 ** 4)),
+                "commentCount": str(rng.randint(0, 10 ** 3))
+            }
+        })
+    return {"kind": "youtube#videoListResponse", "items": items}
+
+
+@app.get("/youtube/v3/search")
+async def search(request: Request):
+    error = await _upstream("youtube:search")
+    if error:
+        return error
+    query = request.query_params.get("q", "")
+    suffix = "".join(ch for ch in query if ch.isdigit()) or "0"
+    channel_id = CHANNEL_PREFIX + suffix.rjust(17, "0")[-17:]
+    return {"kind": "youtube#searchListResponse",
+            "items": [{"id": {"channelId": channel_id}, "snippet": {"channelId": channel_id, "title": query}}]}
@@ -0,0 +1,229 @@
+"""
+Offline load test for main.app against the fake upstreams in fake_upstreams.py.
+
+Starts the fake Groq/YouTube server and the app (both with uvicorn, in
+subprocesses), drives /generate, /generate-from-channel and
+/api/channel-info/{id} at the given concurrency, and reports throughput,
+p50/p95/p99 latency and outbound upstream calls per request.
+
+Run from the WithHTMLYouTubeURL directory:
+    python -m bench.run_benchmark --requests 200 --concurrency 20 --output bench/results/run.json
+    python -m bench.run_benchmark --compare bench/results/run.json
+
+Upstream latency and error injection are passed through to the fake server
+(--latency-ms, --jitter-ms, --error-rate, --error-status).
+"""
+import os
+import sys
+import json
+import time
+import socket
+import asyncio
+import argparse
+import subprocess
+from collections import Counter
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+import httpx
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SCENARIOS = ("generate", "generate-from-channel", "channel-info")
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _start_server(target: str, port: int, env: Dict[str, str]) -> subprocess.Popen:
+    return subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", target, "--host", "127.0.0.1", "--port", str(port),
+         "--log-level", "warning"],
+        cwd=APP_DIR, env={**os.environ, **env}
+    )
+
+
+async def _wait_ready(url: str, timeout: float = 20):
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient() as client:
+        while time.monotonic() < deadline:
+            try:
+                await client.get(url)
+                return
+            except httpx.TransportError:
+                await asyncio.sleep(0.1)
+    raise RuntimeError(f"{url} did not come up within {timeout}s")
+
+
+def percentile(samples: List[float], pct: float) -> float:
+    """Nearest-rank percentile of samples (which must be sorted)"""
+    if not samples:
+        return 0.0
+    rank = max(0, min(len(samples) - 1, int(round(pct / 100 * len(samples))) - 1))
+    return samples[rank]
+
+
+def _request_for(scenario: str, index: int, args) -> Dict[str, Any]:
+    """Method, path and body for the index-th request of a scenario"""
+    topic_id = index if args.unique_topics else index % args.topics
+    channel_id = f"UCbench{index % args.channels:017d}"
+    form = {"topic": f"Benchmark topic {topic_id}", "style": "Conversational", "duration": str(args.duration),
+            "audience": "General", "language": "English", "notes": ""}
+    if scenario == "generate":
+        return {"method": "POST", "url": "/generate", "data": {**form, "tone": "Informative"}}
+    if scenario == "generate-from-channel":
+        return {"method": "POST", "url": "/generate-from-channel", "data": {**form, "channel_id": channel_id}}
+    return {"method": "GET", "url": f"/api/channel-info/{channel_id}"}
+
+
+async def run_scenario(scenario: str, app_url: str, fake_url: str, args) -> Dict[str, Any]:
+    """Send args.requests requests with args.concurrency workers and summarize them"""
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    async with httpx.AsyncClient(base_url=app_url, timeout=args.timeout, limits=limits) as client, \
+            httpx.AsyncClient(base_url=fake_url) as fake:
+        await fake.post("/_reset")
+        latencies: List[float] = []
+        errors = Counter()
+        next_index = iter(range(args.requests))
+
+        async def worker():
+            for index in next_index:
+                started = time.perf_counter()
+                try:
+                    response = await client.request(**_request_for(scenario, index, args))
+                    # The HTML views report failures in the page with a 200
+                    if response.status_code >= 400 or 'class="error"' in response.text:
+                        errors[str(response.status_code)] += 1
+                except httpx.HTTPError as e:
+                    errors[type(e).__name__] += 1
+                latencies.append((time.perf_counter() - started) * 1000)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+        elapsed = time.perf_counter() - started
+        upstream_calls = (await fake.get("/_stats")).json()
+
+    latencies.sort()
+    return {
+        "requests": args.requests,
+        "errors": dict(errors),
+        "elapsed_s": round(elapsed, 3),
+        "throughput_rps": round(args.requests / elapsed, 2),
+        "latency_ms": {
+            "p50": round(percentile(latencies, 50), 2),
+            "p95": round(percentile(latencies, 95), 2),
+            "p99": round(percentile(latencies, 99), 2),
+            "max": round(latencies[-1], 2) if latencies else 0.0
+        },
+        "upstream_calls": upstream_calls,
+        "upstream_calls_per_request": {
+            name: round(count / args.requests, 3) for name, count in sorted(upstream_calls.items())
+        }
+    }
+
+
+def compare(current: Dict[str, Any], baseline: Dict[str, Any]):
+    """Print throughput and latency changes against an earlier run"""
+    for scenario, result in current["scenarios"].items():
+        before = baseline.get("scenarios", {}).get(scenario)
+        if not before:
+            continue
+        print(f"{scenario}:")
+        pairs = [("throughput_rps", result["throughput_rps"], before["throughput_rps"])]
+        pairs += [(f"latency {pct}", result["latency_ms"][pct], before["latency_ms"][pct]) for pct in ("p50", "p95", "p99")]
+        for name, now, then in pairs:
+            change = (now - then) / then * 100 if then else 0.0
+            print(f"  {name:15} {then:10.2f} -> {now:10.2f} ({change:+.1f}%)")
+
+
+async def main(args) -> Dict[str, Any]:
+    fake_port, app_port = _free_port(), _free_port()
+    fake_url = f"http://127.0.0.1:{fake_port}"
+    app_url = f"http://127.0.0.1:{app_port}"
+
+    fake_env = {
+        "FAKE_LATENCY_MS": str(args.latency_ms),
+        "FAKE_JITTER_MS": str(args.jitter_ms),
+        "FAKE_ERROR_RATE": str(args.error_rate),
+        "FAKE_ERROR_STATUS": str(args.error_status),
+        "FAKE_VIDEOS_PER_CHANNEL": str(args.videos_per_channel)
+    }
+    app_env = {
+        "GROQ_URL": f"{fake_url}/openai/v1/chat/completions",
+        "GROQ_API_KEY": "bench",
+        "YOUTUBE_API_URL": f"{fake_url}/youtube/v3",
+        "YOUTUBE_API_KEY": "bench",
+        # Keep state in memory so runs don't affect each other
+        "CHANNEL_INDEX_DB": "",
+        "YOUTUBE_QUOTA_DB": "",
+        "CHANNEL_SYNC_DB": "",
+        "ADMISSION_DB": "",
+        "JOBS_DB": ":memory:",
+        "YOUTUBE_DAILY_QUOTA": str(10 ** 9),
+        # All load comes from one client, so admission limits are set from the command line
+        "ADMISSION_PER_CLIENT": str(args.admission_per_client),
+        "ADMISSION_GROQ_LIMIT": str(args.admission_groq_limit),
+        "ADMISSION_YOUTUBE_LIMIT": str(args.admission_youtube_limit)
+    }
+    processes = [_start_server("bench.fake_upstreams:app", fake_port, fake_env),
+                 _start_server("main:app", app_port, app_env)]
+    try:
+        await _wait_ready(f"{fake_url}/_stats")
+        await _wait_ready(f"{app_url}/")
+        results = {}
+        for scenario in args.scenarios:
+            results[scenario] = await run_scenario(scenario, app_url, fake_url, args)
+            print(f"{scenario}: {results[scenario]['throughput_rps']} req/s, "
+                  f"p50 {results[scenario]['latency_ms']['p50']} ms, "
+                  f"p95 {results[scenario]['latency_ms']['p95']} ms, "
+                  f"p99 {results[scenario]['latency_ms']['p99']} ms, "
+                  f"errors {sum(results[scenario]['errors'].values())}")
+    finally:
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            process.wait()
+
+    return {
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "config": {key: value for key, value in vars(args).items() if key not in ("output", "compare")},
+        "scenarios": results
+    }
+
+
+def parse_args(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=list(SCENARIOS))
+    parser.add_argument("--requests", type=int, default=200, help="requests per scenario")
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--timeout", type=float, default=60)
+    parser.add_argument("--channels", type=int, default=20, help="distinct fake channels to cycle through")
+    parser.add_argument("--topics", type=int, default=50, help="distinct topics to cycle through")
+    parser.add_argument("--unique-topics", action="store_true", help="never repeat a topic (defeats caching)")
+    parser.add_argument("--duration", type=int, default=5)
+    parser.add_argument("--latency-ms", type=float, default=50)
+    parser.add_argument("--jitter-ms", type=float, default=20)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--error-status", type=int, default=503)
+    parser.add_argument("--videos-per-channel", type=int, default=200)
+    parser.add_argument("--admission-per-client", type=int, default=1000,
+                        help="app's ADMISSION_PER_CLIENT (all benchmark load comes from one client)")
+    parser.add_argument("--admission-groq-limit", type=int, default=1000, help="app's ADMISSION_GROQ_LIMIT")
+    parser.add_argument("--admission-youtube-limit", type=int, default=1000, help="app's ADMISSION_YOUTUBE_LIMIT")
+    parser.add_argument("--output", help="write results as JSON to this path")
+    parser.add_argument("--compare", help="JSON results of an earlier run to compare against")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    report = asyncio.run(main(args))
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Results written to {args.output}")
+    if args.compare:
+        with open(args.compare) as f:
+            compare(report, json.load(f))
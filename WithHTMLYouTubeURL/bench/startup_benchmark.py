@@ -0,0 +1,114 @@
+"""
+Cold-start benchmark for main.app: how long `import main` takes, and how long
+a fresh uvicorn worker takes to answer its first request.
+
+Each run starts a new interpreter, so nothing is shared between runs (the OS
+file cache aside). Upstreams are never contacted: the first request is GET /.
+
+Run from the WithHTMLYouTubeURL directory:
+    python -m bench.startup_benchmark --runs 10 --output bench/results/startup.json
+    python -m bench.startup_benchmark --compare bench/results/startup.json
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import statistics
+import subprocess
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+import httpx
+from bench.run_benchmark import APP_DIR, _free_port, _start_server
+
+# Keep state in memory so runs don't read or write the app's SQLite files
+APP_ENV = {
+    "CHANNEL_INDEX_DB": "",
+    "YOUTUBE_QUOTA_DB": "",
+    "CHANNEL_SYNC_DB": "",
+    "ADMISSION_DB": "",
+    "JOBS_DB": ":memory:",
+    "GROQ_API_KEY": "bench",
+    "YOUTUBE_API_KEY": "bench"
+}
+IMPORT_SNIPPET = "import time; started = time.perf_counter(); import main; print(time.perf_counter() - started)"
+
+
+def measure_import(env: Dict[str, str]) -> float:
+    """Seconds spent in `import main` in a fresh interpreter"""
+    output = subprocess.run([sys.executable, "-c", IMPORT_SNIPPET], cwd=APP_DIR, env={**os.environ, **env},
+                            capture_output=True, text=True, check=True).stdout
+    return float(output.strip().splitlines()[-1])
+
+
+def measure_first_request(env: Dict[str, str], timeout: float = 30) -> float:
+    """Seconds from spawning a uvicorn worker to its first successful response"""
+    port = _free_port()
+    started = time.perf_counter()
+    process = _start_server("main:app", port, env)
+    try:
+        deadline = time.monotonic() + timeout
+        with httpx.Client() as client:
+            while time.monotonic() < deadline:
+                try:
+                    if client.get(f"http://127.0.0.1:{port}/").status_code == 200:
+                        return time.perf_counter() - started
+                except httpx.TransportError:
+                    time.sleep(0.005)
+        raise RuntimeError(f"main:app did not answer within {timeout}s")
+    finally:
+        process.terminate()
+        process.wait()
+
+
+def summarize(samples: List[float]) -> Dict[str, float]:
+    return {
+        "min_ms": round(min(samples) * 1000, 1),
+        "median_ms": round(statistics.median(samples) * 1000, 1),
+        "max_ms": round(max(samples) * 1000, 1)
+    }
+
+
+def compare(current: Dict[str, Any], baseline: Dict[str, Any]):
+    """Print median changes against an earlier run"""
+    for name, result in current["results"].items():
+        before = baseline.get("results", {}).get(name)
+        if not before:
+            continue
+        now, then = result["median_ms"], before["median_ms"]
+        change = (now - then) / then * 100 if then else 0.0
+        print(f"  {name:15} {then:10.1f} -> {now:10.1f} ms ({change:+.1f}%)")
+
+
+def main(args) -> Dict[str, Any]:
+    import_times = [measure_import(APP_ENV) for _ in range(args.runs)]
+    first_request_times = [measure_first_request(APP_ENV) for _ in range(args.runs)]
+    results = {"import": summarize(import_times), "first_request": summarize(first_request_times)}
+    for name, result in results.items():
+        print(f"{name}: median {result['median_ms']} ms (min {result['min_ms']}, max {result['max_ms']})")
+    return {
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "config": {"runs": args.runs, "python": sys.version.split()[0]},
+        "results": results
+    }
+
+
+def parse_args(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=10, help="fresh processes per measurement")
+    parser.add_argument("--output", help="write results as JSON to this path")
+    parser.add_argument("--compare", help="JSON results of an earlier run to compare against")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    report = main(args)
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Results written to {args.output}")
+    if args.compare:
+        with open(args.compare) as f:
+            compare(report, json.load(f))
@@ -0,0 +1,79 @@
+"""
+Token budgets sized from the requested script: max_tokens for the LLM reply from
+the duration and the language's speech rate, and caps on user-supplied prompt text.
+"""
+import os
+from typing import NamedTuple
+
+# Rough characters per token for prompt text
+CHARS_PER_TOKEN = 4
+
+# Hard cap on max_tokens for one call, and the headroom above the expected length
+# (script structure, headings and scorecard, and natural variation in length)
+LLM_MAX_OUTPUT_TOKENS = int(os.getenv("LLM_MAX_OUTPUT_TOKENS", "8192"))
+OUTPUT_TOKEN_MARGIN = float(os.getenv("OUTPUT_TOKEN_MARGIN", "1.3"))
+OUTPUT_TOKEN_OVERHEAD = int(os.getenv("OUTPUT_TOKEN_OVERHEAD", "200"))
+# Longest notes passed to the model
+NOTES_MAX_TOKENS = int(os.getenv("NOTES_MAX_TOKENS", "300"))
+
+
+class SpeechRate(NamedTuple):
+    per_minute: int
+    tokens_per_unit: float
+    unit: str
+
+
+# Spoken rate by language, with the tokenizer's tokens per word (per character for
+# languages written without spaces)
+SPEECH_RATES = {
+    "english": SpeechRate(150, 1.3, "words"),
+    "spanish": SpeechRate(160, 1.6, "words"),
+    "portuguese": SpeechRate(155, 1.6, "words"),
+    "french": SpeechRate(150, 1.6, "words"),
+    "italian": SpeechRate(150, 1.7, "words"),
+    "german": SpeechRate(120, 1.8, "words"),
+    "dutch": SpeechRate(130, 1.7, "words"),
+    "indonesian": SpeechRate(140, 1.8, "words"),
+    "turkish": SpeechRate(110, 2.4, "words"),
+    "russian": SpeechRate(120, 2.4, "words"),
+    "arabic": SpeechRate(120, 2.8, "words"),
+    "hindi": SpeechRate(130, 3.0, "words"),
+    "korean": SpeechRate(110, 3.0, "words"),
+    "japanese": SpeechRate(300, 1.1, "characters"),
+    "chinese": SpeechRate(250, 1.2, "characters")
+}
+DEFAULT_SPEECH_RATE = SpeechRate(150, 2.0, "words")
+
+
+def speech_rate(language: str) -> SpeechRate:
+    """Speech rate for a language name such as "Spanish" or "English (US)", or a default"""
+    words = (language or "").casefold().split()
+    return SPEECH_RATES.get(words[0], DEFAULT_SPEECH_RATE) if words else DEFAULT_SPEECH_RATE
+
+
+def script_size(data) -> int:
+    """Words (or characters) of speech that fill the requested duration"""
+    return max(1, data.duration or 1) * speech_rate(data.language).per_minute
+
+
+def output_tokens(language: str, size: int) -> int:
+    """max_tokens for a reply of about `size` words (or characters) in the language"""
+    expected = size * speech_rate(language).tokens_per_unit
+    return min(LLM_MAX_OUTPUT_TOKENS, int(expected * OUTPUT_TOKEN_MARGIN) + OUTPUT_TOKEN_OVERHEAD)
+
+
+def script_max_tokens(data) -> int:
+    """max_tokens for a whole script (build_prompt) for the request"""
+    return output_tokens(data.language, script_size(data))
+
+
+def trim_to_tokens(text: str, max_tokens: int) -> str:
+    """Cut text to about max_tokens tokens, at a word boundary"""
+    text = (text or "").strip()
+    limit = max_tokens * CHARS_PER_TOKEN
+    if len(text) <= limit:
+        return text
+    cut = text[:limit]
+    if " " in cut:
+        cut = cut[:cut.rindex(" ")]
+    return cut.rstrip() + " …"
@@ -0,0 +1,164 @@
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+
+def _sizeof(value: Any) -> int:
+    """Approximate size of a cached value: its JSON encoding in bytes"""
+    return len(json.dumps(value).encode("utf-8"))
+
+
+class TTLCache:
+    """
+    In-memory cache with LRU eviction once max_entries (or max_bytes, if set)
+    is exceeded. Entries expire ttl seconds after they were stored.
+    """
+
+    backend = "memory"
+
+    def __init__(self, max_entries: int = 1024, ttl: float = 3600, max_bytes: Optional[int] = None):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._bytes = 0
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+
+    def get(self, key: str, allow_stale: bool = False) -> Optional[Any]:
+        """Return the cached value, or None when missing or expired (unless allow_stale)"""
+        entry = self._entries.get(key)
+        if entry is None or (entry[0] <= time.monotonic() and not allow_stale):
+            if entry is not None:
+                self.delete(key)
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry[1]
+
+    def set(self, key: str, value: Any):
+        """Store a value, evicting the least recently used entries if full"""
+        size = _sizeof(value) if self.max_bytes else 0
+        self.delete(key)
+        self._entries[key] = (time.monotonic() + self.ttl, value, size)
+        self._bytes += size
+        while len(self._entries) > self.max_entries or (self.max_bytes and self._bytes > self.max_bytes):
+            _, evicted = self._entries.popitem(last=False)
+            self._bytes -= evicted[2]
+
+    def delete(self, key: str):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._bytes -= entry[2]
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def size_bytes(self) -> int:
+        """Bytes held by cached values (only tracked when max_bytes is set)"""
+        return self._bytes
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit/miss counters and occupancy, for the stats endpoint"""
+        lookups = self.hits + self.misses
+        return {
+            "backend": self.backend,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            "size": len(self),
+            "max_entries": self.max_entries,
+            "bytes": self.size_bytes(),
+            "max_bytes": self.max_bytes,
+            "ttl": self.ttl
+        }
+
+
+class SQLiteTTLCache(TTLCache):
+    """
+    TTLCache stored in an SQLite file, so entries survive restarts and are
+    shared by every uvicorn worker pointing at the same path. Values must be
+    JSON-serializable. Hit/miss counters are per process.
+    """
+
+    backend = "sqlite"
+
+    def __init__(self, path: str, table: str = "cache", max_entries: int = 1024, ttl: float = 3600,
+                 max_bytes: Optional[int] = None):
+        super().__init__(max_entries=max_entries, ttl=ttl, max_bytes=max_bytes)
+        self._table = table
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=10, isolation_level=None, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            f"CREATE TABLE IF NOT EXISTS {table} ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL, accessed_at REAL NOT NULL, "
+            "size INTEGER NOT NULL DEFAULT 0)"
+        )
+        columns = [row[1] for row in self._conn.execute(f"PRAGMA table_info({table})")]
+        if "size" not in columns:
+            self._conn.execute(f"ALTER TABLE {table} ADD COLUMN size INTEGER NOT NULL DEFAULT 0")
+        self._conn.execute(f"CREATE INDEX IF NOT EXISTS {table}_accessed ON {table} (accessed_at)")
+
+    def get(self, key: str, allow_stale: bool = False) -> Optional[Any]:
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT value, expires_at FROM {self._table} WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None or (row[1] <= now and not allow_stale):
+                if row is not None:
+                    self._conn.execute(f"DELETE FROM {self._table} WHERE key = ?", (key,))
+                self.misses += 1
+                return None
+            self._conn.execute(f"UPDATE {self._table} SET accessed_at = ? WHERE key = ?", (now, key))
+        self.hits += 1
+        return json.loads(row[0])
+
+    def set(self, key: str, value: Any):
+        now = time.time()
+        encoded = json.dumps(value)
+        with self._lock:
+            self._conn.execute(
+                f"INSERT OR REPLACE INTO {self._table} (key, value, expires_at, accessed_at, size) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (key, encoded, now + self.ttl, now, len(encoded.encode("utf-8")))
+            )
+            self._conn.execute(f"DELETE FROM {self._table} WHERE expires_at <= ?", (now,))
+            self._conn.execute(
+                f"DELETE FROM {self._table} WHERE key IN ("
+                f"SELECT key FROM {self._table} ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,)
+            )
+            if self.max_bytes:
+                # Drop the least recently used rows beyond the byte budget
+                self._conn.execute(
+                    f"DELETE FROM {self._table} WHERE key IN (SELECT key FROM ("
+                    f"SELECT key, SUM(size) OVER (ORDER BY accessed_at DESC, key) AS running FROM {self._table}"
+                    ") WHERE running > ?)",
+                    (self.max_bytes,)
+                )
+
+    def delete(self, key: str):
+        with self._lock:
+            self._conn.execute(f"DELETE FROM {self._table} WHERE key = ?", (key,))
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute(f"SELECT COUNT(*) FROM {self._table}").fetchone()[0]
+
+    def size_bytes(self) -> int:
+        with self._lock:
+            return self._conn.execute(f"SELECT COALESCE(SUM(size), 0) FROM {self._table}").fetchone()[0]
+
+
+def make_cache(max_entries: int, ttl: float, db_path: Optional[str] = None, table: str = "cache",
+               max_bytes: Optional[int] = None) -> TTLCache:
+    """Build an SQLite-backed cache when db_path is set, otherwise an in-memory one"""
+    if db_path:
+        return SQLiteTTLCache(db_path, table=table, max_entries=max_entries, ttl=ttl, max_bytes=max_bytes)
+    return TTLCache(max_entries=max_entries, ttl=ttl, max_bytes=max_bytes)
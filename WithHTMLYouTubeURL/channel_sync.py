@@ -0,0 +1,101 @@
+import time
+from collections import Counter
+from typing import Any, Dict, List, Optional
+from cache import TTLCache
+from tone_analyzer import ToneAnalyzer
+from youtube_client import YouTubeClient
+
+
+class ChannelSync:
+    """
+    Incremental channel refresh: re-analyzing a channel only fetches what changed.
+
+    Per channel, the store keeps the channel item and its ETag, the uploads
+    playlist ETag, the recent videos (without descriptions) with each video's
+    tone keyword counts, and the summed tone scores. A refresh sends conditional
+    requests, fetches details only for new uploads, and updates the scores by
+    adding the new videos' counts and subtracting those of videos that fell out
+    of the window. An unchanged channel costs one 304 playlistItems call, plus a
+    channels call once its metadata is older than metadata_ttl.
+    """
+
+    def __init__(self, client: YouTubeClient, analyzer: ToneAnalyzer, store: TTLCache, metadata_ttl: float = 86400):
+        self._client = client
+        self._analyzer = analyzer
+        self._store = store
+        self.metadata_ttl = metadata_ttl
+
+    def _channel_counts(self, channel: Dict[str, Any]) -> Counter:
+        """Tone keyword counts of the channel's own title, description and keywords"""
+        text = ' '.join([
+            channel['snippet']['title'],
+            channel['snippet']['description'],
+            channel.get('brandingSettings', {}).get('channel', {}).get('keywords', '')
+        ]).lower()
+        return Counter(self._analyzer.score_text(text))
+
+    async def refresh(self, channel_id: str, max_videos: int) -> Optional[Dict[str, Any]]:
+        """
+        Bring a UC... channel's sync state up to date and return the analysis as
+        {"channel", "primary_tone", "secondary_tones", "tone_scores"}, or None if
+        the channel doesn't exist.
+        """
+        state = self._store.get(channel_id)
+        # A different video window size invalidates the running scores
+        if state is not None and state["max_videos"] != max_videos:
+            state = None
+        fetch_channel = state is None or time.time() - state["channel_checked_at"] > self.metadata_ttl
+
+        changes = await self._client.get_channel_changes(
+            channel_id,
+            max_videos,
+            channel_etag=state["channel_etag"] if state else None,
+            uploads_etag=state["uploads_etag"] if state else None,
+            known_video_ids={video["id"] for video in state["videos"]} if state else None,
+            fetch_channel=fetch_channel
+        )
+        if changes is None:
+            self._store.delete(channel_id)
+            return None
+
+        if state is None:
+            state = {"max_videos": max_videos, "channel": None, "channel_counts": {}, "videos": [], "scores": {}}
+        scores = Counter(state["scores"])
+
+        if fetch_channel:
+            state["channel_checked_at"] = time.time()
+        if changes["channel"] is not None:
+            channel_counts = self._channel_counts(changes["channel"])
+            scores.update(channel_counts)
+            scores.subtract(state["channel_counts"])
+            state["channel"] = changes["channel"]
+            state["channel_counts"] = dict(channel_counts)
+
+        if changes["new_videos"] is not None:
+            new_videos = []
+            for video in changes["new_videos"]:
+                counts = self._analyzer.score_text(f"{video['title']} {video['description']}".lower())
+                scores.update(counts)
+                new_videos.append({**{key: value for key, value in video.items() if key != 'description'},
+                                   "tone_counts": counts})
+            videos: List[Dict[str, Any]] = new_videos + state["videos"]
+            for dropped in videos[max_videos:]:
+                scores.subtract(dropped["tone_counts"])
+            state["videos"] = videos[:max_videos]
+
+        state["channel_etag"] = changes["channel_etag"]
+        state["uploads_etag"] = changes["uploads_etag"]
+        state["scores"] = {tone: scores.get(tone, 0) for tone in self._analyzer.TONE_KEYWORDS}
+        self._store.set(channel_id, state)
+
+        tones = self._analyzer.rank(state["scores"], 2)
+        channel_data = YouTubeClient.channel_record(
+            channel_id, state["channel"],
+            [{key: value for key, value in video.items() if key != "tone_counts"} for video in state["videos"]]
+        )
+        return {
+            "channel": channel_data,
+            "primary_tone": tones.primary_tone,
+            "secondary_tones": tones.secondary_tones,
+            "tone_scores": tones.scores
+        }
@@ -0,0 +1,85 @@
+import gzip
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESSIBLE_TYPES = ("text/", "application/json", "application/javascript", "application/xml", "image/svg+xml")
+
+
+def _choose_encoding(accept_encoding: str):
+    """br (if the brotli package is installed) or gzip, whichever the client accepts, preferring br"""
+    accepted = set()
+    for part in accept_encoding.lower().split(","):
+        name, _, params = part.partition(";")
+        quality = params.strip().replace(" ", "")
+        try:
+            if quality.startswith("q=") and float(quality[2:]) == 0:
+                continue
+        except ValueError:
+            pass
+        accepted.add(name.strip())
+    if brotli is not None and "br" in accepted:
+        return "br"
+    if "gzip" in accepted:
+        return "gzip"
+    return None
+
+
+class CompressionMiddleware:
+    """
+    Compress responses of at least minimum_size bytes with brotli or gzip.
+
+    Only bodies sent in one piece are compressed. Streamed responses (SSE, NDJSON)
+    pass through untouched, since compressing them would hold back each chunk
+    until the compressor flushes.
+    """
+
+    def __init__(self, app: ASGIApp, minimum_size: int = 1000, gzip_level: int = 6, brotli_quality: int = 4):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        encoding = _choose_encoding(Headers(scope=scope).get("accept-encoding", "")) if scope["type"] == "http" else None
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start = None
+        started = False
+
+        async def send_compressed(message: Message):
+            nonlocal start, started
+            if message["type"] == "http.response.start":
+                start = message
+                return
+            if message["type"] != "http.response.body" or started:
+                await send(message)
+                return
+
+            started = True
+            headers = MutableHeaders(raw=start["headers"])
+            body = message.get("body", b"")
+            if (message.get("more_body", False) or "content-encoding" in headers
+                    or len(body) < self.minimum_size
+                    or not headers.get("content-type", "").startswith(COMPRESSIBLE_TYPES)):
+                await send(start)
+                await send(message)
+                return
+
+            if encoding == "br":
+                body = brotli.compress(body, quality=self.brotli_quality)
+            else:
+                body = gzip.compress(body, compresslevel=self.gzip_level)
+            headers["Content-Encoding"] = encoding
+            headers["Content-Length"] = str(len(body))
+            headers.add_vary_header("Accept-Encoding")
+            await send(start)
+            await send({**message, "body": body})
+
+        await self.app(scope, receive, send_compressed)
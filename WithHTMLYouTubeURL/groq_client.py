@@ -1,24 +1,285 @@
 import os
+import json
+import time
+import random
+import asyncio
 import httpx
+from email.utils import parsedate_to_datetime
+from datetime import datetime, timezone
+from typing import Any, AsyncIterator, Dict, List, Optional
 from dotenv import load_dotenv
+from metrics import timed, record_stage, UPSTREAM_CALLS, UPSTREAM_ERRORS, LLM_TOKENS, LLM_CONTINUATIONS
+from llm_router import Backend, CircuitBreaker, LLMRouter
+from scheduler import current_scheduler, estimate_tokens
 
 load_dotenv()
 GROQ_API_KEY = os.getenv("GROQ_API_KEY")
 MODEL_NAME = "meta-llama/llama-4-scout-17b-16e-instruct"
-GROQ_URL = "https://api.groq.com/openai/v1/chat/completions"
+TEMPERATURE = 0.7
+GROQ_URL = os.getenv("GROQ_URL", "https://api.groq.com/openai/v1/chat/completions")
 
-async def get_script(prompt: str):
+# Connection pool and timeouts for the shared client
+GROQ_MAX_CONNECTIONS = int(os.getenv("GROQ_MAX_CONNECTIONS", "20"))
+GROQ_MAX_KEEPALIVE = int(os.getenv("GROQ_MAX_KEEPALIVE", "10"))
+GROQ_KEEPALIVE_EXPIRY = float(os.getenv("GROQ_KEEPALIVE_EXPIRY", "30"))
+GROQ_HTTP2 = os.getenv("GROQ_HTTP2", "").lower() in ("1", "true", "yes")
+GROQ_CONNECT_TIMEOUT = float(os.getenv("GROQ_CONNECT_TIMEOUT", "5"))
+GROQ_READ_TIMEOUT = float(os.getenv("GROQ_READ_TIMEOUT", "120"))
+GROQ_POOL_TIMEOUT = float(os.getenv("GROQ_POOL_TIMEOUT", "10"))
+
+# Retries on 429/5xx and transport errors, with jittered exponential backoff
+GROQ_MAX_RETRIES = int(os.getenv("GROQ_MAX_RETRIES", "3"))
+GROQ_BACKOFF_BASE = float(os.getenv("GROQ_BACKOFF_BASE", "0.5"))
+GROQ_BACKOFF_MAX = float(os.getenv("GROQ_BACKOFF_MAX", "20"))
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+
+# OpenAI-compatible backends, in priority order, as a JSON list of
+#   {"name": ..., "url": ..., "model": ..., "api_key_env": "ENV_VAR_WITH_KEY"}
+# Unset: GROQ_URL with MODEL_NAME only.
+LLM_BACKENDS = os.getenv("LLM_BACKENDS")
+# Send the request to the next backend too if the current one hasn't answered
+# (or streamed a first token) after this many seconds; unset disables hedging
+LLM_HEDGE_AFTER = float(os.getenv("LLM_HEDGE_AFTER")) if os.getenv("LLM_HEDGE_AFTER") else None
+# Most backends tried for one request (hedges and failovers included)
+LLM_MAX_ATTEMPTS = int(os.getenv("LLM_MAX_ATTEMPTS", "2"))
+# Consecutive failures that take a backend out of rotation, and for how long
+LLM_BREAKER_FAILURES = int(os.getenv("LLM_BREAKER_FAILURES", "5"))
+LLM_BREAKER_COOLDOWN = float(os.getenv("LLM_BREAKER_COOLDOWN", "30"))
+
+# Follow-up calls asking for the rest of a reply cut off at max_tokens. They get a
+# third of the budget and are asked to wrap up, so an overlong reply still ends soon.
+LLM_MAX_CONTINUATIONS = int(os.getenv("LLM_MAX_CONTINUATIONS", "2"))
+CONTINUE_PROMPT = ("Continue exactly where you stopped and bring the reply to its end concisely, "
+                   "keeping the same format. Do not repeat anything you already wrote.")
+
+_client: Optional[httpx.AsyncClient] = None
+
+
+def start_client() -> httpx.AsyncClient:
+    """Create the shared keep-alive client (called from the app lifespan)"""
+    global _client
+    if _client is None:
+        http2 = GROQ_HTTP2
+        if http2:
+            try:
+                import h2  # noqa: F401
+            except ImportError:
+                print("GROQ_HTTP2 is set but the h2 package is missing; using HTTP/1.1")
+                http2 = False
+        _client = httpx.AsyncClient(
+            http2=http2,
+            timeout=httpx.Timeout(
+                connect=GROQ_CONNECT_TIMEOUT,
+                read=GROQ_READ_TIMEOUT,
+                write=GROQ_CONNECT_TIMEOUT,
+                pool=GROQ_POOL_TIMEOUT
+            ),
+            limits=httpx.Limits(
+                max_connections=GROQ_MAX_CONNECTIONS,
+                max_keepalive_connections=GROQ_MAX_KEEPALIVE,
+                keepalive_expiry=GROQ_KEEPALIVE_EXPIRY
+            )
+        )
+    return _client
+
+
+async def close_client():
+    """Close the shared client and its pooled connections"""
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+
+def _retry_delay(attempt: int, response: Optional[httpx.Response] = None) -> float:
+    """Seconds to wait before retry number `attempt` (0-based), honoring Retry-After"""
+    if response is not None:
+        retry_after = response.headers.get("Retry-After")
+        if retry_after:
+            try:
+                return min(float(retry_after), GROQ_BACKOFF_MAX)
+            except ValueError:
+                try:
+                    retry_at = parsedate_to_datetime(retry_after)
+                    delay = (retry_at - datetime.now(timezone.utc)).total_seconds()
+                    return min(max(delay, 0.0), GROQ_BACKOFF_MAX)
+                except (TypeError, ValueError):
+                    pass
+    # Full jitter: uniform between 0 and the capped exponential step
+    return random.uniform(0, min(GROQ_BACKOFF_MAX, GROQ_BACKOFF_BASE * (2 ** attempt)))
+
+
+async def _send(payload: dict, stream: bool = False, url: str = GROQ_URL, api_key: Optional[str] = GROQ_API_KEY,
+                upstream: str = "groq") -> httpx.Response:
+    """
+    POST a chat-completions payload through the shared client, retrying on
+    429/5xx responses and transport errors. With stream=True the returned
+    response body has not been read yet and must be closed by the caller.
+    """
+    client = start_client()
     headers = {
-        "Authorization": f"Bearer {GROQ_API_KEY}",
+        "Authorization": f"Bearer {api_key}",
         "Content-Type": "application/json"
     }
-    payload = {
-        "model": MODEL_NAME,
-        "messages": [{"role": "user", "content": prompt}],
-        "temperature": 0.7
-    }
+    request = client.build_request("POST", url, json=payload, headers=headers)
+    for attempt in range(GROQ_MAX_RETRIES + 1):
+        UPSTREAM_CALLS.inc(upstream, "chat_completions")
+        try:
+            response = await client.send(request, stream=stream)
+        except httpx.TransportError:
+            UPSTREAM_ERRORS.inc(upstream, "chat_completions")
+            if attempt == GROQ_MAX_RETRIES:
+                raise
+            await asyncio.sleep(_retry_delay(attempt))
+            continue
+
+        if response.is_error:
+            UPSTREAM_ERRORS.inc(upstream, "chat_completions")
+        if response.status_code not in RETRY_STATUS_CODES or attempt == GROQ_MAX_RETRIES:
+            if response.is_error:
+                await response.aread()
+                await response.aclose()
+            response.raise_for_status()
+            return response
+
+        await response.aclose()
+        await asyncio.sleep(_retry_delay(attempt, response))
+
+
+async def _complete_on(backend: Backend, payload: Dict[str, Any]) -> Dict[str, Any]:
+    """One chat completion on one backend"""
+    response = await _send(payload, url=backend.url, api_key=backend.api_key, upstream=backend.name)
+    return response.json()
+
+
+async def _stream_from(backend: Backend, payload: Dict[str, Any]) -> AsyncIterator[Any]:
+    """
+    Content deltas of one streamed chat completion on one backend, then a dict with
+    the reply's finish_reason and usage (if the backend reported them)
+    """
+    response = await _send({**payload, "stream": True}, stream=True, url=backend.url, api_key=backend.api_key,
+                           upstream=backend.name)
+    finish_reason, usage = None, None
+    try:
+        # The body is a series of "data: {chunk}" lines ending with "data: [DONE]"
+        async for line in response.aiter_lines():
+            if not line.startswith("data:"):
+                continue
+            data = line[len("data:"):].strip()
+            if data == "[DONE]":
+                break
+            chunk = json.loads(data)
+            # OpenAI reports usage in the last chunk, Groq under x_groq
+            usage = chunk.get("usage") or chunk.get("x_groq", {}).get("usage") or usage
+            if not chunk.get("choices"):
+                continue
+            finish_reason = chunk["choices"][0].get("finish_reason") or finish_reason
+            content = chunk["choices"][0].get("delta", {}).get("content")
+            if content:
+                yield content
+    finally:
+        await response.aclose()
+    yield {"finish_reason": finish_reason, "usage": usage}
+
+
+def _load_backends() -> List[Backend]:
+    """Backends from LLM_BACKENDS, or the single Groq backend"""
+    if not LLM_BACKENDS:
+        configs = [{"name": "groq", "url": GROQ_URL, "model": MODEL_NAME, "api_key_env": "GROQ_API_KEY"}]
+    else:
+        configs = json.loads(LLM_BACKENDS)
+    return [
+        Backend(
+            name=config.get("name", config["model"]),
+            url=config["url"],
+            model=config["model"],
+            api_key=os.getenv(config["api_key_env"]) if config.get("api_key_env") else config.get("api_key"),
+            breaker=CircuitBreaker(LLM_BREAKER_FAILURES, LLM_BREAKER_COOLDOWN)
+        )
+        for config in configs
+    ]
+
+
+router = LLMRouter(_load_backends(), _complete_on, _stream_from, hedge_after=LLM_HEDGE_AFTER,
+                   max_attempts=LLM_MAX_ATTEMPTS)
+
+
+def _payload(messages: List[Dict[str, str]], max_tokens: Optional[int]) -> Dict[str, Any]:
+    payload = {"messages": messages, "temperature": TEMPERATURE}
+    if max_tokens:
+        # Continuations (after the first user message and reply) get a smaller budget
+        payload["max_tokens"] = max_tokens if len(messages) == 1 else max(256, max_tokens // 3)
+    return payload
+
+
+def _record_tokens(max_tokens: Optional[int], usage: Optional[Dict[str, Any]], finish_reason: Optional[str]):
+    """Count and log the tokens requested and used by one call"""
+    usage = usage or {}
+    if max_tokens:
+        LLM_TOKENS.inc("requested", amount=max_tokens)
+    for kind in ("prompt", "completion"):
+        if usage.get(f"{kind}_tokens") is not None:
+            LLM_TOKENS.inc(kind, amount=usage[f"{kind}_tokens"])
+    print(f"LLM call: max_tokens={max_tokens} prompt_tokens={usage.get('prompt_tokens')} "
+          f"completion_tokens={usage.get('completion_tokens')} finish_reason={finish_reason}")
+
+
+async def _continue(messages: List[Dict[str, str]], content: str, max_tokens: Optional[int]) -> List[Dict[str, str]]:
+    """
+    Messages asking the model to continue its cut-off reply. Under a scheduler the
+    extra call is charged to its request and token budgets first.
+    """
+    LLM_CONTINUATIONS.inc()
+    messages = messages + [{"role": "assistant", "content": content}, {"role": "user", "content": CONTINUE_PROMPT}]
+    scheduler = current_scheduler.get()
+    if scheduler is not None:
+        prompt = "".join(message["content"] for message in messages)
+        await scheduler.charge(estimate_tokens(prompt, _payload(messages, max_tokens).get("max_tokens", 0)))
+    return messages
+
+
+async def get_script(prompt: str, max_tokens: Optional[int] = None) -> str:
+    """
+    Complete the prompt in at most max_tokens tokens. A reply cut off at the limit
+    is continued, up to LLM_MAX_CONTINUATIONS times, and returned whole.
+    """
+    messages = [{"role": "user", "content": prompt}]
+    parts = []
+    for attempt in range(LLM_MAX_CONTINUATIONS + 1):
+        payload = _payload(messages, max_tokens)
+        with timed("groq"):
+            body = await router.complete(payload)
+        choice = body["choices"][0]
+        content = choice["message"].get("content") or ""
+        parts.append(content)
+        _record_tokens(payload.get("max_tokens"), body.get("usage"), choice.get("finish_reason"))
+        if choice.get("finish_reason") != "length" or attempt == LLM_MAX_CONTINUATIONS:
+            break
+        messages = await _continue(messages, content, max_tokens)
+    return "".join(parts)
+
 
-    async with httpx.AsyncClient() as client:
-        response = await client.post(GROQ_URL, json=payload, headers=headers)
-        response.raise_for_status()
-        return response.json()["choices"][0]["message"]["content"]
+async def get_script_stream(prompt: str, max_tokens: Optional[int] = None) -> AsyncIterator[str]:
+    """
+    Yield the script as content deltas using the chat-completions stream mode,
+    continuing the reply like get_script if it is cut off at max_tokens
+    """
+    messages = [{"role": "user", "content": prompt}]
+    started = time.perf_counter()
+    first_token = True
+    for attempt in range(LLM_MAX_CONTINUATIONS + 1):
+        content, summary = [], {}
+        payload = _payload(messages, max_tokens)
+        async for delta in router.stream(payload):
+            if isinstance(delta, dict):
+                summary = delta
+                continue
+            if first_token:
+                record_stage("groq_first_token", time.perf_counter() - started)
+                first_token = False
+            content.append(delta)
+            yield delta
+        _record_tokens(payload.get("max_tokens"), summary.get("usage"), summary.get("finish_reason"))
+        if summary.get("finish_reason") != "length" or attempt == LLM_MAX_CONTINUATIONS:
+            break
+        messages = await _continue(messages, "".join(content), max_tokens)
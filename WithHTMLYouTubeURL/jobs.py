@@ -0,0 +1,182 @@
+import json
+import time
+import uuid
+import asyncio
+import sqlite3
+import threading
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+# A job handler gets the job type and payload and returns a JSON-serializable result
+JobHandler = Callable[[str, Dict[str, Any]], Awaitable[Dict[str, Any]]]
+
+
+class QueueFull(Exception):
+    """Raised by enqueue when max_queued jobs are already waiting"""
+
+
+class JobStore:
+    """
+    Job records in SQLite, so queued and finished jobs survive restarts and
+    several uvicorn workers can pull from one queue.
+
+    Status goes queued -> running -> done | failed. A running job whose worker
+    died is claimed again once its lease (lease_seconds) has expired, unless it
+    has already been claimed max_attempts times: then it is marked failed, so a
+    job that keeps killing its worker isn't retried forever.
+    """
+
+    def __init__(self, path: str, lease_seconds: float = 600, max_attempts: int = 3):
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=10, isolation_level=None, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            "id TEXT PRIMARY KEY, type TEXT NOT NULL, payload TEXT NOT NULL, status TEXT NOT NULL, "
+            "result TEXT, error TEXT, attempts INTEGER NOT NULL DEFAULT 0, "
+            "created_at REAL NOT NULL, started_at REAL, finished_at REAL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS jobs_status_created ON jobs (status, created_at)")
+
+    def add(self, job_type: str, payload: Dict[str, Any]) -> str:
+        job_id = uuid.uuid4().hex
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO jobs (id, type, payload, status, created_at) VALUES (?, ?, ?, 'queued', ?)",
+                (job_id, job_type, json.dumps(payload), time.time())
+            )
+        return job_id
+
+    def count(self, status: str) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM jobs WHERE status = ?", (status,)).fetchone()[0]
+
+    def claim(self) -> Optional[Dict[str, Any]]:
+        """Atomically mark the oldest runnable job as running and return it"""
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.execute(
+                    "UPDATE jobs SET status = 'failed', error = ?, finished_at = ? "
+                    "WHERE status = 'running' AND started_at < ? AND attempts >= ?",
+                    (f"Gave up after {self.max_attempts} attempts: the worker running the job stopped",
+                     now, now - self.lease_seconds, self.max_attempts)
+                )
+                row = self._conn.execute(
+                    "SELECT id, type, payload FROM jobs WHERE status = 'queued' "
+                    "OR (status = 'running' AND started_at < ?) ORDER BY created_at LIMIT 1",
+                    (now - self.lease_seconds,)
+                ).fetchone()
+                if row:
+                    self._conn.execute(
+                        "UPDATE jobs SET status = 'running', started_at = ?, attempts = attempts + 1 WHERE id = ?",
+                        (now, row[0])
+                    )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        if not row:
+            return None
+        return {"id": row[0], "type": row[1], "payload": json.loads(row[2])}
+
+    def finish(self, job_id: str, result: Optional[Dict[str, Any]] = None, error: Optional[str] = None):
+        with self._lock:
+            self._conn.execute(
+                "UPDATE jobs SET status = ?, result = ?, error = ?, finished_at = ? WHERE id = ?",
+                ("failed" if error else "done", json.dumps(result) if result is not None else None,
+                 error, time.time(), job_id)
+            )
+
+    def requeue(self, job_id: str):
+        """Put an interrupted job back at the front of the queue"""
+        with self._lock:
+            self._conn.execute(
+                "UPDATE jobs SET status = 'queued', started_at = NULL WHERE id = ? AND status = 'running'",
+                (job_id,)
+            )
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT id, type, status, result, error, attempts, created_at, started_at, finished_at "
+                "FROM jobs WHERE id = ?", (job_id,)
+            ).fetchone()
+        if not row:
+            return None
+        return {
+            "id": row[0],
+            "type": row[1],
+            "status": row[2],
+            "result": json.loads(row[3]) if row[3] else None,
+            "error": row[4],
+            "attempts": row[5],
+            "created_at": row[6],
+            "started_at": row[7],
+            "finished_at": row[8]
+        }
+
+
+class JobQueue:
+    """
+    Runs jobs from a JobStore on a pool of asyncio workers.
+
+    Enqueueing only writes a row, so bursts are accepted quickly; the workers
+    then process them `workers` at a time. Workers are woken on enqueue and also
+    poll, to pick up jobs enqueued by other processes.
+    """
+
+    def __init__(self, store: JobStore, handler: JobHandler, workers: int = 2,
+                 max_queued: int = 10000, poll_interval: float = 1.0):
+        self.store = store
+        self._handler = handler
+        self._workers = workers
+        self._max_queued = max_queued
+        self._poll_interval = poll_interval
+        self._wakeup: Optional[asyncio.Event] = None
+        self._tasks: List[asyncio.Task] = []
+
+    def enqueue(self, job_type: str, payload: Dict[str, Any]) -> str:
+        if self.store.count("queued") >= self._max_queued:
+            raise QueueFull(f"Job queue is full ({self._max_queued} jobs waiting)")
+        job_id = self.store.add(job_type, payload)
+        if self._wakeup is not None:
+            self._wakeup.set()
+        return job_id
+
+    def start(self):
+        self._wakeup = asyncio.Event()
+        self._tasks = [asyncio.create_task(self._work()) for _ in range(self._workers)]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def _work(self):
+        while True:
+            job = self.store.claim()
+            if job is None:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), self._poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            try:
+                result = await self._handler(job["type"], job["payload"])
+            except asyncio.CancelledError:
+                # Shutting down: let the next start pick the job up again
+                self.store.requeue(job["id"])
+                raise
+            except Exception as e:
+                self.store.finish(job["id"], error=str(e))
+            else:
+                self.store.finish(job["id"], result=result)
+
+    def stats(self) -> Dict[str, int]:
+        return {status: self.store.count(status) for status in ("queued", "running", "done", "failed")}
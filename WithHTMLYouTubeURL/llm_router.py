@@ -0,0 +1,261 @@
+import time
+import asyncio
+from collections import deque
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional
+from metrics import LLM_BACKEND_DURATION, LLM_HEDGES
+
+
+class CircuitBreaker:
+    """
+    Takes a backend out of rotation after `failure_threshold` consecutive failures.
+    After `cooldown` seconds one trial request is let through (half-open): success
+    closes the breaker, failure opens it for another cooldown.
+    """
+
+    def __init__(self, failure_threshold: int = 5, cooldown: float = 30):
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self._trial_running = False
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.cooldown:
+            return "half-open"
+        return "open"
+
+    def allow(self) -> bool:
+        """Whether a request may be sent now (claims the trial slot when half-open)"""
+        state = self.state
+        if state == "closed":
+            return True
+        if state == "half-open" and not self._trial_running:
+            self._trial_running = True
+            return True
+        return False
+
+    def record_success(self):
+        self.failures = 0
+        self.opened_at = None
+        self._trial_running = False
+
+    def record_failure(self):
+        self.failures += 1
+        self._trial_running = False
+        if self.opened_at is not None or self.failures >= self.failure_threshold:
+            self.opened_at = time.monotonic()
+
+    def release(self):
+        """Give back a half-open trial slot whose request was cancelled"""
+        self._trial_running = False
+
+
+class Backend:
+    """One OpenAI-compatible chat-completions endpoint and model, with its health and latency"""
+
+    def __init__(self, name: str, url: str, model: str, api_key: Optional[str] = None,
+                 breaker: Optional[CircuitBreaker] = None, window: int = 1000):
+        self.name = name
+        self.url = url
+        self.model = model
+        self.api_key = api_key
+        self.breaker = breaker or CircuitBreaker()
+        self.calls = 0
+        self.errors = 0
+        self.cancelled = 0
+        self.wins = 0
+        # Latencies (seconds) of the last `window` successful calls
+        self._latencies = deque(maxlen=window)
+
+    def record(self, seconds: float, outcome: str):
+        """Record one finished call: ok, error or cancelled"""
+        LLM_BACKEND_DURATION.observe(self.name, outcome, value=seconds)
+        if outcome == "ok":
+            self._latencies.append(seconds)
+            self.breaker.record_success()
+        elif outcome == "error":
+            self.errors += 1
+            self.breaker.record_failure()
+        else:
+            self.cancelled += 1
+            self.breaker.release()
+
+    def stats(self) -> Dict[str, Any]:
+        latencies = sorted(self._latencies)
+
+        def percentile(pct: float) -> Optional[float]:
+            if not latencies:
+                return None
+            return round(latencies[min(len(latencies) - 1, int(pct / 100 * len(latencies)))] * 1000, 1)
+
+        return {
+            "name": self.name,
+            "model": self.model,
+            "state": self.breaker.state,
+            "calls": self.calls,
+            "errors": self.errors,
+            "cancelled": self.cancelled,
+            "wins": self.wins,
+            "latency_ms": {"p50": percentile(50), "p95": percentile(95), "p99": percentile(99)}
+        }
+
+
+# complete(backend, payload) returns the response body; stream(backend, payload) yields
+# content deltas (and may end with a dict summarizing the reply)
+CompleteFn = Callable[[Backend, Dict[str, Any]], Awaitable[Dict[str, Any]]]
+StreamFn = Callable[[Backend, Dict[str, Any]], AsyncIterator[Any]]
+
+
+class LLMRouter:
+    """
+    Sends chat completions to the first healthy backend, hedging slow calls.
+
+    If the current attempt hasn't finished (or, when streaming, produced its first
+    token) within hedge_after seconds, the request is also sent to the next healthy
+    backend, and so on; the first to succeed wins and the others are cancelled.
+    A failed attempt brings in the next backend at once. Backends whose circuit
+    breaker is open are skipped. hedge_after=None disables hedging (failover only).
+    """
+
+    def __init__(self, backends: List[Backend], complete: CompleteFn, stream: StreamFn,
+                 hedge_after: Optional[float] = None, max_attempts: int = 2):
+        self.backends = backends
+        self.hedge_after = hedge_after
+        self.max_attempts = max_attempts
+        self._complete = complete
+        self._stream = stream
+        self.hedges = 0
+
+    async def _race(self, start: Callable[[Backend], Awaitable[Any]],
+                    discard: Optional[Callable[[Any], Awaitable[None]]] = None) -> Any:
+        """
+        Run start(backend) with hedging and failover, return the first result and
+        cancel the other attempts (results that lose a tie go to `discard`).
+        Raises the last error if every attempt fails.
+        """
+        candidates = list(self.backends)
+        running: Dict[asyncio.Task, Backend] = {}
+        attempts = 0
+        last_error: Optional[BaseException] = None
+
+        def launch(force: bool = False) -> bool:
+            """Start the next backend whose breaker lets a request through"""
+            nonlocal attempts
+            while candidates and attempts < self.max_attempts:
+                backend = candidates.pop(0)
+                if backend.breaker.allow() or force:
+                    attempts += 1
+                    backend.calls += 1
+                    running[asyncio.create_task(start(backend))] = backend
+                    return True
+            return False
+
+        # With every breaker open, still try the primary rather than fail outright
+        if not launch():
+            candidates = list(self.backends)
+            launch(force=True)
+        winner = None
+        try:
+            while running:
+                can_hedge = self.hedge_after is not None and candidates and attempts < self.max_attempts
+                done, _ = await asyncio.wait(running, timeout=self.hedge_after if can_hedge else None,
+                                             return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    # Slow attempt: hedge with the next backend
+                    slow = next(iter(running.values()))
+                    if launch():
+                        self.hedges += 1
+                        LLM_HEDGES.inc(slow.name)
+                    continue
+                for task in done:
+                    backend = running.pop(task)
+                    if task.exception() is not None:
+                        last_error = task.exception()
+                    elif winner is None:
+                        backend.wins += 1
+                        winner = task
+                    elif discard is not None:
+                        await discard(task.result())
+                if winner is not None:
+                    return winner.result()
+                launch()
+            raise last_error
+        finally:
+            for task in running:
+                task.cancel()
+            for result in await asyncio.gather(*running, return_exceptions=True):
+                # An attempt may have finished just before it was cancelled
+                if discard is not None and not isinstance(result, BaseException):
+                    await discard(result)
+
+    async def complete(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        """Return the chat-completions response body from the fastest healthy backend"""
+
+        async def attempt(backend: Backend) -> Dict[str, Any]:
+            started = time.perf_counter()
+            try:
+                body = await self._complete(backend, {**payload, "model": backend.model})
+            except asyncio.CancelledError:
+                backend.record(time.perf_counter() - started, "cancelled")
+                raise
+            except Exception:
+                backend.record(time.perf_counter() - started, "error")
+                raise
+            backend.record(time.perf_counter() - started, "ok")
+            return body
+
+        return await self._race(attempt)
+
+    async def stream(self, payload: Dict[str, Any]) -> AsyncIterator[Any]:
+        """
+        Yield content deltas from the backend that produces the first token soonest.
+        Hedging only covers the wait for the first token; after that the winning
+        stream is followed to the end.
+        """
+
+        async def attempt(backend: Backend):
+            started = time.perf_counter()
+            deltas = self._stream(backend, {**payload, "model": backend.model})
+            try:
+                first = await deltas.__anext__()
+            except asyncio.CancelledError:
+                backend.record(time.perf_counter() - started, "cancelled")
+                await deltas.aclose()
+                raise
+            except StopAsyncIteration:
+                first = ""
+            except Exception:
+                backend.record(time.perf_counter() - started, "error")
+                await deltas.aclose()
+                raise
+            return backend, started, first, deltas
+
+        async def discard(result):
+            backend, started, _, deltas = result
+            backend.record(time.perf_counter() - started, "cancelled")
+            await deltas.aclose()
+
+        backend, started, first, deltas = await self._race(attempt, discard)
+        outcome = "cancelled"
+        try:
+            if first:
+                yield first
+            async for delta in deltas:
+                yield delta
+            outcome = "ok"
+        except Exception:
+            outcome = "error"
+            raise
+        finally:
+            backend.record(time.perf_counter() - started, outcome)
+            await deltas.aclose()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "hedge_after": self.hedge_after,
+            "hedges": self.hedges,
+            "backends": [backend.stats() for backend in self.backends]
+        }
@@ -1,24 +1,407 @@
-from fastapi import FastAPI, Request, Form, HTTPException
-from fastapi.responses import HTMLResponse, JSONResponse
-from fastapi.staticfiles import StaticFiles
+from fastapi import FastAPI, Request, Form, HTTPException, Body, Query
+from fastapi.responses import HTMLResponse, JSONResponse, StreamingResponse, PlainTextResponse
 from fastapi.templating import Jinja2Templates
-from groq_client import get_script
+from starlette.background import BackgroundTask
+from groq_client import get_script, get_script_stream, start_client, close_client, router as llm_router
+from budget import script_max_tokens
 from prompts import build_prompt
-from models import ScriptRequest, YouTubeChannelRequest, ChannelInfo, ToneAnalysisResult
-from youtube_client import YouTubeClient
+from models import ScriptRequest, YouTubeChannelRequest, BulkChannelRequest, ChannelInfo, ToneAnalysisResult
+from youtube_client import YouTubeClient, YouTubeAPIError, RECENT_VIDEO_COUNT, YOUTUBE_BULK_CONCURRENCY, YOUTUBE_HISTORY_MAX_VIDEOS
+from quota import QuotaManager, QuotaExceeded, quota_budget
 from tone_analyzer import ToneAnalyzer
+from channel_sync import ChannelSync
+from cache import make_cache
+from script_cache import script_cache, script_cache_key, similar_scripts, find_similar_script, index_script
+from scheduler import RateLimitedScheduler, estimate_tokens
+from singleflight import SingleFlight
+from sectioned import generate_sectioned_script, iter_sectioned_script
+from jobs import JobStore, JobQueue, QueueFull
+from admission import AdmissionController, Overloaded, admission_client, client_id
+from compression import CompressionMiddleware
+from static_files import CachedStaticFiles, STATIC_DIR, static_url
+from metrics import timed, request_timings, server_timing_header, render_metrics, REQUEST_DURATION, ADMISSION_QUEUE_DEPTH
+from contextlib import asynccontextmanager
+from pydantic import ValidationError
+from typing import Any, Dict, List, Optional, Tuple
+import asyncio
 import json
+import os
+import time
 
-app = FastAPI()
+# Compact JSON for the API responses: orjson when installed, else the standard encoder
+try:
+    import orjson  # noqa: F401
+    from fastapi.responses import ORJSONResponse as CompactJSONResponse
+except ImportError:
+    CompactJSONResponse = JSONResponse
 
-# Mount static and template folders
-app.mount("/static", StaticFiles(directory="static"), name="static")
-templates = Jinja2Templates(directory="templates")
+# Handle / custom URL -> channel ID. Persisted to CHANNEL_INDEX_DB (set it to an
+# empty string to keep the index in memory only).
+channel_index = make_cache(
+    max_entries=int(os.getenv("CHANNEL_INDEX_SIZE", "100000")),
+    ttl=float(os.getenv("CHANNEL_INDEX_TTL", str(30 * 24 * 3600))),
+    db_path=os.getenv("CHANNEL_INDEX_DB", "channel_index.db") or None,
+    table="channel_index"
+)
+
+# Daily YouTube Data API budget, persisted to YOUTUBE_QUOTA_DB and shared by workers.
+# Below YOUTUBE_QUOTA_REDUCE_BELOW of the budget left, channels are fetched with
+# YOUTUBE_DEGRADED_VIDEOS videos; below YOUTUBE_QUOTA_CACHE_ONLY_BELOW only cached
+# channels are served.
+youtube_quota = QuotaManager(
+    daily_limit=int(os.getenv("YOUTUBE_DAILY_QUOTA", "10000")),
+    db_path=os.getenv("YOUTUBE_QUOTA_DB", "youtube_quota.db") or None,
+    reduce_below=float(os.getenv("YOUTUBE_QUOTA_REDUCE_BELOW", "0.2")),
+    cache_only_below=float(os.getenv("YOUTUBE_QUOTA_CACHE_ONLY_BELOW", "0.05"))
+)
+DEGRADED_VIDEO_COUNT = int(os.getenv("YOUTUBE_DEGRADED_VIDEOS", "5"))
+# Default per-request quota budget (unset: only the daily budget applies)
+REQUEST_QUOTA_BUDGET = int(os.getenv("YOUTUBE_REQUEST_QUOTA_BUDGET")) if os.getenv("YOUTUBE_REQUEST_QUOTA_BUDGET") else None
 
 # Initialize clients
-youtube_client = YouTubeClient()
+youtube_client = YouTubeClient(index=channel_index, quota=youtube_quota)
 tone_analyzer = ToneAnalyzer()
 
+# Per-channel ETags, recent videos and tone counts, so re-analyzing a channel only
+# fetches what changed. Persisted to CHANNEL_SYNC_DB (empty string: memory only).
+channel_sync = ChannelSync(
+    youtube_client,
+    tone_analyzer,
+    make_cache(
+        max_entries=int(os.getenv("CHANNEL_SYNC_SIZE", "10000")),
+        ttl=float(os.getenv("CHANNEL_SYNC_TTL", str(30 * 24 * 3600))),
+        db_path=os.getenv("CHANNEL_SYNC_DB", "channel_sync.db") or None,
+        table="channel_sync"
+    ),
+    metadata_ttl=float(os.getenv("CHANNEL_SYNC_METADATA_TTL", "86400"))
+)
+
+# Channel payload + tone analysis, keyed by resolved channel ID. Set
+# CHANNEL_CACHE_DB to a file path to persist it and share it between workers.
+channel_cache = make_cache(
+    max_entries=int(os.getenv("CHANNEL_CACHE_SIZE", "512")),
+    ttl=float(os.getenv("CHANNEL_CACHE_TTL", "3600")),
+    db_path=os.getenv("CHANNEL_CACHE_DB") or None,
+    table="channel_cache"
+)
+
+# Concurrent identical channel lookups / script generations share one upstream call
+channel_flights = SingleFlight()
+script_flights = SingleFlight()
+
+# Full-history analysis: halve a video's weight every TONE_RECENCY_HALF_LIFE_DAYS (0 disables)
+TONE_RECENCY_HALF_LIFE_DAYS = float(os.getenv("TONE_RECENCY_HALF_LIFE_DAYS", "365"))
+
+# Most channels accepted by one /api/channels/analyze call
+BULK_CHANNELS_MAX_SIZE = int(os.getenv("BULK_CHANNELS_MAX_SIZE", "1000"))
+
+# Batch generation runs under the Groq rate limits
+BATCH_MAX_SIZE = int(os.getenv("BATCH_MAX_SIZE", "500"))
+batch_scheduler = RateLimitedScheduler(
+    concurrency=int(os.getenv("BATCH_CONCURRENCY", "4")),
+    requests_per_minute=float(os.getenv("GROQ_REQUESTS_PER_MINUTE", "30")),
+    tokens_per_minute=float(os.getenv("GROQ_TOKENS_PER_MINUTE", "30000"))
+)
+
+# Admission control for interactive requests: at most ADMISSION_GROQ_LIMIT script
+# generations and ADMISSION_YOUTUBE_LIMIT channel fetches at a time across all workers
+# sharing ADMISSION_DB, each client holding or waiting for at most ADMISSION_PER_CLIENT
+# of them. Requests that can't get a slot within ADMISSION_QUEUE_TIMEOUT seconds, or
+# find ADMISSION_MAX_QUEUE requests already waiting, get a 503 (429 past the per-client
+# limit) with Retry-After. Batch and job generations have their own limits.
+admission = AdmissionController(
+    limits={
+        "groq": int(os.getenv("ADMISSION_GROQ_LIMIT", "16")),
+        "youtube": int(os.getenv("ADMISSION_YOUTUBE_LIMIT", "8"))
+    },
+    db_path=os.getenv("ADMISSION_DB", "admission.db") or None,
+    per_client=int(os.getenv("ADMISSION_PER_CLIENT", "4")),
+    max_queue=int(os.getenv("ADMISSION_MAX_QUEUE", "100")),
+    queue_timeout=float(os.getenv("ADMISSION_QUEUE_TIMEOUT", "10")),
+    lease=float(os.getenv("ADMISSION_LEASE_SECONDS", "600"))
+)
+ADMISSION_QUEUE_DEPTH.collect = admission.depths
+# Identify clients by the first X-Forwarded-For address (only behind a trusted proxy)
+ADMISSION_TRUST_FORWARDED = os.getenv("ADMISSION_TRUST_FORWARDED", "").lower() in ("1", "true", "yes")
+ADMITTED_PATHS = {"/generate", "/generate-from-channel", "/api/generate/stream", "/api/generate",
+                  "/api/generate-from-channel"}
+
+
+async def run_job(job_type: str, payload: Dict[str, Any]) -> Dict[str, Any]:
+    """Job handler for job_queue: generate a script, deriving the tone from the channel for channel jobs"""
+    fresh = payload.pop("fresh", False)
+    sectioned = payload.pop("sectioned", False)
+    if job_type == "channel":
+        request = YouTubeChannelRequest(**payload)
+        analysis = await get_channel_analysis(request.channel_id)
+        if not analysis:
+            raise ValueError("Channel not found")
+        data = ScriptRequest(tone=analysis["primary_tone"], **request.dict(exclude={"channel_id"}))
+        script, _ = await generate_script(data, fresh, scheduler=batch_scheduler, sectioned=sectioned)
+        return {
+            "script": script,
+            "channel": {
+                "id": analysis["channel"].get("id", ""),
+                "title": analysis["channel"].get("title", "")
+            },
+            "tones": {"primary": analysis["primary_tone"], "secondary": analysis["secondary_tones"]}
+        }
+
+    script, _ = await generate_script(ScriptRequest(**payload), fresh, scheduler=batch_scheduler, sectioned=sectioned)
+    return {"script": script}
+
+
+# Queued script generations, stored in JOBS_DB so they survive restarts. JOB_WORKERS
+# jobs run at a time per process, and their LLM calls share the batch rate limits. A job
+# whose worker dies is retried after JOB_LEASE_SECONDS, up to JOB_MAX_ATTEMPTS claims in all.
+job_queue = JobQueue(
+    JobStore(os.getenv("JOBS_DB", "jobs.db"), lease_seconds=float(os.getenv("JOB_LEASE_SECONDS", "600")),
+             max_attempts=int(os.getenv("JOB_MAX_ATTEMPTS", "3"))),
+    run_job,
+    workers=int(os.getenv("JOB_WORKERS", "2")),
+    max_queued=int(os.getenv("JOB_MAX_QUEUED", "10000")),
+    poll_interval=float(os.getenv("JOB_POLL_INTERVAL", "1"))
+)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Open the pooled Groq client, compile the templates and start the job workers on
+    startup; stop them on shutdown. The YouTube client connects on first use.
+    """
+    start_client()
+    # Compile every template now rather than in the first request that renders it
+    for name in templates.env.list_templates():
+        templates.get_template(name)
+    job_queue.start()
+    yield
+    await job_queue.stop()
+    await close_client()
+    await youtube_client.aclose()
+
+
+app = FastAPI(lifespan=lifespan)
+# Compress whole responses of at least COMPRESSION_MIN_SIZE bytes (brotli if installed, else gzip)
+app.add_middleware(
+    CompressionMiddleware,
+    minimum_size=int(os.getenv("COMPRESSION_MIN_SIZE", "1000")),
+    gzip_level=int(os.getenv("COMPRESSION_GZIP_LEVEL", "6")),
+    brotli_quality=int(os.getenv("COMPRESSION_BROTLI_QUALITY", "4"))
+)
+
+# Mount static and template folders
+app.mount("/static", CachedStaticFiles(directory=STATIC_DIR), name="static")
+templates = Jinja2Templates(directory="templates")
+templates.env.globals["static_url"] = static_url
+
+
+@app.middleware("http")
+async def timing_middleware(request: Request, call_next):
+    """Collect per-stage timings for the request and report them in Server-Timing"""
+    timings = {}
+    token = request_timings.set(timings)
+    started = time.perf_counter()
+    try:
+        response = await call_next(request)
+    finally:
+        request_timings.reset(token)
+    elapsed = time.perf_counter() - started
+    route = request.scope.get("route")
+    REQUEST_DURATION.observe(request.method, route.path if route else "unmatched", str(response.status_code),
+                             value=elapsed)
+    response.headers["Server-Timing"] = server_timing_header(timings, elapsed)
+    return response
+
+
+@app.middleware("http")
+async def admission_middleware(request: Request, call_next):
+    """Tag interactive requests with their client so their upstream calls go through admission control"""
+    path = request.url.path
+    if path not in ADMITTED_PATHS and not path.startswith("/api/channel-info/"):
+        return await call_next(request)
+    host = request.client.host if request.client else None
+    token = admission_client.set(client_id(request.headers, host, ADMISSION_TRUST_FORWARDED))
+    try:
+        return await call_next(request)
+    finally:
+        admission_client.reset(token)
+
+
+async def get_channel_analysis(channel_id: str, quota_units: Optional[int] = REQUEST_QUOTA_BUDGET) -> Optional[Dict[str, Any]]:
+    """
+    Return {"channel", "primary_tone", "secondary_tones", "tone_scores"} for a channel ID or URL,
+    served from channel_cache when possible. Returns None if the channel is not found.
+
+    At most quota_units YouTube quota units are spent. As the daily or request budget
+    runs low, fewer videos are fetched, then only cached (even expired) data is served,
+    and finally QuotaExceeded is raised.
+    """
+    with quota_budget(quota_units):
+        max_videos = youtube_quota.plan(RECENT_VIDEO_COUNT, DEGRADED_VIDEO_COUNT)
+        with timed("extract_channel_id"):
+            resolved_id = await youtube_client.extract_channel_id(channel_id, online=max_videos is not None)
+        analysis = channel_cache.get(resolved_id, allow_stale=max_videos is None)
+        if analysis is not None:
+            return analysis
+        if max_videos is None:
+            raise youtube_quota.uncached_error()
+
+        return await channel_flights.do(resolved_id, lambda: _fetch_channel_analysis(resolved_id, max_videos))
+
+
+async def _fetch_channel_analysis(resolved_id: str, max_videos: int) -> Optional[Dict[str, Any]]:
+    """
+    Fetch and analyze a channel, then store the result in channel_cache. Channel IDs
+    go through channel_sync, which only fetches uploads added since the last sync.
+    """
+    async with admission.slot("youtube"):
+        if resolved_id.startswith("UC"):
+            try:
+                analysis = await channel_sync.refresh(resolved_id, max_videos)
+            except QuotaExceeded:
+                raise
+            except Exception as e:
+                print(f"Error syncing channel: {str(e)}")
+                return None
+            if analysis:
+                channel_cache.set(resolved_id, analysis)
+            return analysis
+
+        channel_data = await youtube_client.get_channel_info(resolved_id, max_videos)
+    if not channel_data:
+        return None
+    return _analyze_channel(resolved_id, channel_data)
+
+
+def _analyze_channel(resolved_id: str, channel_data: Dict[str, Any]) -> Dict[str, Any]:
+    """Run tone analysis over fetched channel data and store the result in channel_cache"""
+    with timed("tone_analysis"):
+        tones = tone_analyzer.analyze(channel_data)
+    analysis = {
+        "channel": channel_data,
+        "primary_tone": tones.primary_tone,
+        "secondary_tones": tones.secondary_tones,
+        "tone_scores": tones.scores
+    }
+    channel_cache.set(resolved_id, analysis)
+    return analysis
+
+
+async def get_channel_history_analysis(channel_id: str, quota_units: Optional[int] = REQUEST_QUOTA_BUDGET,
+                                       weighted: bool = True) -> Optional[Dict[str, Any]]:
+    """
+    Like get_channel_analysis, but scores tone over the channel's whole upload history
+    (up to YOUTUBE_HISTORY_MAX_VIDEOS, fewer if the quota budget can't cover them),
+    weighting videos by engagement and recency when `weighted` is set.
+    """
+    with quota_budget(quota_units):
+        max_videos = youtube_quota.plan(YOUTUBE_HISTORY_MAX_VIDEOS, YOUTUBE_HISTORY_MAX_VIDEOS)
+        with timed("extract_channel_id"):
+            resolved_id = await youtube_client.extract_channel_id(channel_id, online=max_videos is not None)
+        key = f"history:{'weighted' if weighted else 'flat'}:{resolved_id}"
+        analysis = channel_cache.get(key, allow_stale=max_videos is None)
+        if analysis is not None:
+            return analysis
+        if max_videos is None:
+            raise youtube_quota.uncached_error()
+
+        return await channel_flights.do(key, lambda: _fetch_history_analysis(resolved_id, key, max_videos, weighted))
+
+
+async def _fetch_history_analysis(resolved_id: str, key: str, max_videos: int, weighted: bool) -> Optional[Dict[str, Any]]:
+    """Stream a channel's uploads through the vectorized tone analysis and cache the result"""
+    async with admission.slot("youtube"):
+        channel_data = await youtube_client.get_channel_info(resolved_id, max_videos=0)
+        if not channel_data or not resolved_id.startswith("UC"):
+            return None
+
+        with timed("tone_analysis_history"):
+            tones, videos_analyzed = await tone_analyzer.analyze_history(
+                channel_data,
+                youtube_client.iter_upload_pages(resolved_id, max_videos),
+                weight_by_engagement=weighted,
+                recency_half_life_days=TONE_RECENCY_HALF_LIFE_DAYS if weighted else None
+            )
+    analysis = {
+        "channel": channel_data,
+        "primary_tone": tones.primary_tone,
+        "secondary_tones": tones.secondary_tones,
+        "tone_scores": tones.scores,
+        "videos_analyzed": videos_analyzed
+    }
+    channel_cache.set(key, analysis)
+    return analysis
+
+
+async def generate_script(data: ScriptRequest, fresh: bool = False,
+                          scheduler: Optional[RateLimitedScheduler] = None,
+                          sectioned: bool = False) -> Tuple[str, str]:
+    """
+    Generate a script for the request, served from script_cache (or the script of a
+    near-duplicate request) unless fresh is set.
+    Cache misses go through the scheduler, if given, so only real LLM calls spend budget.
+    With sectioned, the script is written as concurrent sections from an outline
+    (see sectioned.py) instead of in one completion.
+    Returns the script and the cache status reported in X-Cache (HIT, SIMILAR, MISS or BYPASS).
+    """
+    mode = "sectioned" if sectioned else None
+    key = script_cache_key(data, mode=mode)
+    if not fresh:
+        script = script_cache.get(key)
+        if script is not None:
+            return script, "HIT"
+        script = find_similar_script(data, mode)
+        if script is not None:
+            return script, "SIMILAR"
+
+    script = await script_flights.do(key, lambda: _generate_and_cache(data, key, scheduler, sectioned))
+    return script, "BYPASS" if fresh else "MISS"
+
+
+def _section_complete(scheduler: Optional[RateLimitedScheduler]):
+    """
+    complete(prompt, max_tokens) for sectioned scripts, whose caller holds one groq
+    slot for the request. One call at a time runs in that slot; calls running
+    alongside it take fan-out slots, so the fan-out counts against the groq limit
+    but not the client's share. Calls go through the scheduler, if given.
+    """
+    own_slot = asyncio.Lock()
+
+    async def call(prompt: str, max_tokens: int) -> str:
+        if scheduler:
+            return await scheduler.run(lambda: get_script(prompt, max_tokens), estimate_tokens(prompt, max_tokens))
+        return await get_script(prompt, max_tokens)
+
+    async def complete(prompt: str, max_tokens: int) -> str:
+        if not own_slot.locked():
+            async with own_slot:
+                return await call(prompt, max_tokens)
+        async with admission.slot("groq", fanout=True):
+            return await call(prompt, max_tokens)
+
+    return complete
+
+
+async def _generate_and_cache(data: ScriptRequest, key: str, scheduler: Optional[RateLimitedScheduler],
+                              sectioned: bool = False) -> str:
+    """Call the LLM for a script (holding groq admission slots) and store it in script_cache"""
+    async with admission.slot("groq"):
+        if sectioned:
+            script = await generate_sectioned_script(data, _section_complete(scheduler))
+        else:
+            with timed("build_prompt"):
+                prompt = build_prompt(data)
+            max_tokens = script_max_tokens(data)
+            if scheduler:
+                script = await scheduler.run(lambda: get_script(prompt, max_tokens),
+                                             estimate_tokens(prompt, max_tokens))
+            else:
+                script = await get_script(prompt, max_tokens)
+    script_cache.set(key, script)
+    index_script(key, data, "sectioned" if sectioned else None)
+    return script
+
 
 @app.get("/", response_class=HTMLResponse)
 async def form_page(request: Request):
@@ -35,7 +418,9 @@ async def generate_script_view(
     duration: int = Form(5),
     audience: str = Form("General"),
     language: str = Form("English"),
-    notes: str = Form("")
+    notes: str = Form(""),
+    fresh: bool = Form(False),
+    sectioned: bool = Form(False)
 ):
     """Generate a script using the provided form parameters"""
     data = ScriptRequest(
@@ -48,13 +433,20 @@ async def generate_script_view(
         notes=notes
     )
     try:
-        prompt = build_prompt(data)
-        result = await get_script(prompt)
-        return templates.TemplateResponse("index.html", {
+        result, cache_status = await generate_script(data, fresh, sectioned=sectioned)
+        response = templates.TemplateResponse("index.html", {
             "request": request, 
             "script": result,
             "form_data": data.dict()
         })
+        response.headers["X-Cache"] = cache_status
+        return response
+    except Overloaded as oe:
+        return templates.TemplateResponse("index.html", {
+            "request": request,
+            "error": str(oe),
+            "form_data": data.dict()
+        }, status_code=oe.status_code, headers={"Retry-After": str(oe.retry_after)})
     except Exception as e:
         error_message = f"Error generating script: {str(e)}"
         return templates.TemplateResponse("index.html", {
@@ -64,6 +456,242 @@ async def generate_script_view(
         })
 
 
+def _timings_ms() -> Dict[str, float]:
+    """Stage timings of the current request so far, in milliseconds"""
+    return {stage: round(seconds * 1000, 1) for stage, seconds in (request_timings.get() or {}).items()}
+
+
+@app.post("/api/generate", response_class=CompactJSONResponse)
+async def generate_script_api(data: ScriptRequest, fresh: bool = False, sectioned: bool = False):
+    """
+    Generate a script from a JSON ScriptRequest. Returns {"script", "cache", "tones",
+    "timings"}, with the cache status (as in X-Cache) and stage timings in ms.
+    """
+    try:
+        script, cache_status = await generate_script(data, fresh, sectioned=sectioned)
+    except Overloaded as oe:
+        raise HTTPException(status_code=oe.status_code, detail=str(oe), headers={"Retry-After": str(oe.retry_after)})
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error generating script: {str(e)}")
+    return CompactJSONResponse({
+        "script": script,
+        "cache": cache_status,
+        "tones": {"primary": data.tone, "secondary": []},
+        "timings": _timings_ms()
+    }, headers={"X-Cache": cache_status})
+
+
+@app.post("/api/generate-from-channel", response_class=CompactJSONResponse)
+async def generate_from_channel_api(request: YouTubeChannelRequest, fresh: bool = False, sectioned: bool = False,
+                                    quota_budget: Optional[int] = REQUEST_QUOTA_BUDGET):
+    """
+    Generate a script in the tone of a YouTube channel from a JSON YouTubeChannelRequest.
+    Returns {"script", "cache", "channel", "tones", "timings"}.
+    """
+    try:
+        analysis = await get_channel_analysis(request.channel_id, quota_budget)
+        if not analysis:
+            raise HTTPException(status_code=404, detail="Channel not found")
+        data = ScriptRequest(tone=analysis["primary_tone"], **request.dict(exclude={"channel_id"}))
+        script, cache_status = await generate_script(data, fresh, sectioned=sectioned)
+    except QuotaExceeded as qe:
+        raise HTTPException(status_code=qe.status_code, detail=str(qe), headers=qe.headers)
+    except Overloaded as oe:
+        raise HTTPException(status_code=oe.status_code, detail=str(oe), headers={"Retry-After": str(oe.retry_after)})
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error processing request: {str(e)}")
+
+    channel_data = analysis["channel"]
+    return CompactJSONResponse({
+        "script": script,
+        "cache": cache_status,
+        "channel": {
+            "id": channel_data.get("id", ""),
+            "title": channel_data.get("title", ""),
+            "subscribers": channel_data.get("subscriberCount", 0),
+            "videos": channel_data.get("videoCount", 0)
+        },
+        "tones": {"primary": analysis["primary_tone"], "secondary": analysis["secondary_tones"]},
+        "timings": _timings_ms()
+    }, headers={"X-Cache": cache_status})
+
+
+@app.post("/api/generate/stream")
+async def generate_script_stream_api(data: ScriptRequest, fresh: bool = False, sectioned: bool = False):
+    """
+    Stream a script as Server-Sent Events: one `data: {"token": ...}` event per
+    content delta, then an `event: done` (or `event: error`) event.
+    A cached script is sent as a single token. With sectioned, each token is a
+    whole part of the script, sent as soon as it and the parts before it are ready.
+    """
+    mode = "sectioned" if sectioned else None
+    key = script_cache_key(data, mode=mode)
+    cached = None if fresh else script_cache.get(key)
+    cache_status = "HIT" if cached is not None else ("BYPASS" if fresh else "MISS")
+    if cached is None and not fresh:
+        cached = find_similar_script(data, mode)
+        if cached is not None:
+            cache_status = "SIMILAR"
+    # Wait for a groq slot before answering, so a shed request gets a real 503/429
+    slot = None
+    if cached is None:
+        try:
+            slot = await admission.acquire("groq")
+        except Overloaded as oe:
+            raise HTTPException(status_code=oe.status_code, detail=str(oe),
+                                headers={"Retry-After": str(oe.retry_after)})
+
+    async def event_stream():
+        if cached is not None:
+            yield f"data: {json.dumps({'token': cached})}\n\n"
+            yield "event: done\ndata: {}\n\n"
+            return
+        try:
+            tokens = []
+            if sectioned:
+                token_stream = iter_sectioned_script(data, _section_complete(None))
+            else:
+                with timed("build_prompt"):
+                    prompt = build_prompt(data)
+                token_stream = get_script_stream(prompt, script_max_tokens(data))
+            async for token in token_stream:
+                tokens.append(token)
+                yield f"data: {json.dumps({'token': token})}\n\n"
+            script_cache.set(key, "".join(tokens))
+            index_script(key, data, mode)
+            yield "event: done\ndata: {}\n\n"
+        except Exception as e:
+            yield f"event: error\ndata: {json.dumps({'detail': f'Error generating script: {str(e)}'})}\n\n"
+
+    async def release_slot():
+        nonlocal slot
+        await admission.release("groq", slot)
+        slot = None
+
+    # Released as a background task, which also runs when the client disconnects
+    # mid-stream (the generator's own cleanup doesn't run then)
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no", "X-Cache": cache_status},
+        background=BackgroundTask(release_slot)
+    )
+
+
+@app.post("/api/generate-batch")
+async def generate_batch_api(requests: List[ScriptRequest], fresh: bool = False):
+    """
+    Generate many scripts under the configured concurrency and rate limits.
+    Streams one NDJSON line per request as it completes, in completion order;
+    each line carries the request's index and either the script or its error.
+    """
+    if len(requests) > BATCH_MAX_SIZE:
+        raise HTTPException(status_code=413, detail=f"Batch is limited to {BATCH_MAX_SIZE} requests")
+
+    async def run_item(index: int, data: ScriptRequest) -> Dict[str, Any]:
+        try:
+            script, cache_status = await generate_script(data, fresh, scheduler=batch_scheduler)
+            return {"index": index, "status": "ok", "topic": data.topic, "script": script, "cache": cache_status}
+        except Exception as e:
+            return {"index": index, "status": "error", "topic": data.topic, "error": f"Error generating script: {str(e)}"}
+
+    async def results():
+        tasks = [asyncio.create_task(run_item(index, data)) for index, data in enumerate(requests)]
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                yield json.dumps(await next_done) + "\n"
+        finally:
+            # Client went away: stop the remaining generations
+            for task in tasks:
+                task.cancel()
+
+    return StreamingResponse(results(), media_type="application/x-ndjson")
+
+
+@app.post("/api/channels/analyze")
+async def analyze_channels_api(request: BulkChannelRequest,
+                               quota_units: Optional[int] = Query(REQUEST_QUOTA_BUDGET, alias="quota_budget")):
+    """
+    Tone analysis for many channels. Streams one NDJSON line per input as results
+    are ready: cached channels first, then the rest as their group of 50 completes.
+    Each line carries the input's index and either the channel summary and tones or an error.
+    """
+    if len(request.channel_ids) > BULK_CHANNELS_MAX_SIZE:
+        raise HTTPException(status_code=413, detail=f"Bulk analysis is limited to {BULK_CHANNELS_MAX_SIZE} channels")
+
+    def result_line(index: int, analysis: Optional[Dict[str, Any]], error: Optional[str] = None) -> str:
+        item = {"index": index, "input": request.channel_ids[index]}
+        if analysis:
+            channel_data = analysis["channel"]
+            item.update({
+                "status": "ok",
+                "channel": {
+                    "id": channel_data.get("id", ""),
+                    "title": channel_data.get("title", ""),
+                    "subscribers": channel_data.get("subscriberCount", 0),
+                    "videos": channel_data.get("videoCount", 0)
+                },
+                "tones": {
+                    "primary": analysis["primary_tone"],
+                    "secondary": analysis["secondary_tones"],
+                    "scores": analysis.get("tone_scores", {})
+                }
+            })
+        else:
+            item.update({"status": "error", "error": error or "Channel not found"})
+        return json.dumps(item) + "\n"
+
+    async def results():
+        with quota_budget(quota_units):
+            max_videos = youtube_quota.plan(RECENT_VIDEO_COUNT, DEGRADED_VIDEO_COUNT)
+            online = max_videos is not None
+
+            # Resolve URLs and handles (index hits are free), a few lookups at a time
+            semaphore = asyncio.Semaphore(YOUTUBE_BULK_CONCURRENCY)
+
+            async def resolve(channel_input: str) -> Tuple[Optional[str], Optional[str]]:
+                """(channel ID, None), or (None, error) if the lookup failed or ran out of quota"""
+                async with semaphore:
+                    try:
+                        return await youtube_client.extract_channel_id(channel_input, online=online), None
+                    except (QuotaExceeded, YouTubeAPIError) as e:
+                        return None, str(e)
+
+            resolved = await asyncio.gather(*(resolve(channel_input) for channel_input in request.channel_ids))
+
+            pending: Dict[str, List[int]] = {}
+            for index, (resolved_id, error) in enumerate(resolved):
+                if error is not None:
+                    yield result_line(index, None, error)
+                    continue
+                analysis = channel_cache.get(resolved_id, allow_stale=not online)
+                if analysis is not None:
+                    yield result_line(index, analysis)
+                elif not online:
+                    yield result_line(index, None, "YouTube API quota is nearly used up and this channel is not cached")
+                elif not resolved_id.startswith("UC"):
+                    yield result_line(index, None)
+                else:
+                    pending.setdefault(resolved_id, []).append(index)
+
+            if pending:
+                try:
+                    async for resolved_id, channel_data, error in youtube_client.get_channels_info(list(pending),
+                                                                                                   max_videos):
+                        analysis = _analyze_channel(resolved_id, channel_data) if channel_data else None
+                        for index in pending.pop(resolved_id):
+                            yield result_line(index, analysis, error)
+                except (QuotaExceeded, YouTubeAPIError) as e:
+                    # Report the channels not answered yet rather than cutting the stream short
+                    for indexes in pending.values():
+                        for index in indexes:
+                            yield result_line(index, None, str(e))
+
+    return StreamingResponse(results(), media_type="application/x-ndjson")
+
+
 @app.post("/generate-from-channel", response_class=HTMLResponse)
 async def generate_from_channel_view(
     request: Request,
@@ -73,18 +701,21 @@ async def generate_from_channel_view(
     duration: int = Form(5),
     audience: str = Form("General"),
     language: str = Form("English"),
-    notes: str = Form("")
+    notes: str = Form(""),
+    fresh: bool = Form(False),
+    sectioned: bool = Form(False),
+    quota_budget: Optional[int] = Form(REQUEST_QUOTA_BUDGET)
 ):
     """Generate a script using the tone derived from a YouTube channel"""
     try:
-        # Get channel info
-        channel_data = youtube_client.get_channel_info(channel_id)
-        if not channel_data:
+        # Get channel info and tone analysis
+        analysis = await get_channel_analysis(channel_id, quota_budget)
+        if not analysis:
             raise HTTPException(status_code=404, detail="Channel not found")
         
-        # Analyze tone
-        primary_tone = tone_analyzer.analyze_channel_tone(channel_data)
-        secondary_tones = tone_analyzer.get_secondary_tones(channel_data)
+        channel_data = analysis["channel"]
+        primary_tone = analysis["primary_tone"]
+        secondary_tones = analysis["secondary_tones"]
         
         # Create script request with channel tone
         data = ScriptRequest(
@@ -98,8 +729,7 @@ async def generate_from_channel_view(
         )
         
         # Generate script
-        prompt = build_prompt(data)
-        result = await get_script(prompt)
+        result, cache_status = await generate_script(data, fresh, sectioned=sectioned)
         
         # Prepare channel info for template
         channel_info = {
@@ -111,13 +741,43 @@ async def generate_from_channel_view(
             "secondary_tones": secondary_tones
         }
         
-        return templates.TemplateResponse("index.html", {
+        response = templates.TemplateResponse("index.html", {
             "request": request, 
             "script": result,
             "form_data": data.dict(),
             "channel_info": channel_info,
             "channel_id": channel_id
         })
+        response.headers["X-Cache"] = cache_status
+        return response
+    except Overloaded as oe:
+        return templates.TemplateResponse("index.html", {
+            "request": request,
+            "error": str(oe),
+            "form_data": {
+                "topic": topic,
+                "style": style,
+                "duration": duration,
+                "audience": audience,
+                "language": language,
+                "notes": notes
+            },
+            "channel_id": channel_id
+        }, status_code=oe.status_code, headers={"Retry-After": str(oe.retry_after)})
+    except QuotaExceeded as qe:
+        return templates.TemplateResponse("index.html", {
+            "request": request,
+            "error": f"{str(qe)}. Please try again later." if qe.retry_after is not None else str(qe),
+            "form_data": {
+                "topic": topic,
+                "style": style,
+                "duration": duration,
+                "audience": audience,
+                "language": language,
+                "notes": notes
+            },
+            "channel_id": channel_id
+        }, status_code=qe.status_code, headers=qe.headers)
     except HTTPException as he:
         return templates.TemplateResponse("index.html", {
             "request": request,
@@ -150,17 +810,25 @@ async def generate_from_channel_view(
 
 
 @app.get("/api/channel-info/{channel_id}", response_class=JSONResponse)
-async def get_channel_info_api(channel_id: str):
-    """API endpoint to get channel info and tone analysis"""
+async def get_channel_info_api(channel_id: str, quota_budget: Optional[int] = REQUEST_QUOTA_BUDGET,
+                               history: bool = False, weighted: bool = True):
+    """
+    API endpoint to get channel info and tone analysis. With history=true the tone is
+    scored over the whole upload history, engagement- and recency-weighted unless weighted=false.
+    """
     try:
-        channel_data = youtube_client.get_channel_info(channel_id)
-        if not channel_data:
+        if history:
+            analysis = await get_channel_history_analysis(channel_id, quota_budget, weighted)
+        else:
+            analysis = await get_channel_analysis(channel_id, quota_budget)
+        if not analysis:
             raise HTTPException(status_code=404, detail="Channel not found")
         
-        primary_tone = tone_analyzer.analyze_channel_tone(channel_data)
-        secondary_tones = tone_analyzer.get_secondary_tones(channel_data)
+        channel_data = analysis["channel"]
+        primary_tone = analysis["primary_tone"]
+        secondary_tones = analysis["secondary_tones"]
         
-        return {
+        result = {
             "channel": {
                 "id": channel_data.get("id", ""),
                 "title": channel_data.get("title", ""),
@@ -173,5 +841,80 @@ async def get_channel_info_api(channel_id: str):
                 "secondary": secondary_tones
             }
         }
+        if history:
+            result["tones"]["scores"] = analysis["tone_scores"]
+            result["videos_analyzed"] = analysis["videos_analyzed"]
+        return result
+    except QuotaExceeded as qe:
+        raise HTTPException(status_code=qe.status_code, detail=str(qe), headers=qe.headers)
+    except Overloaded as oe:
+        raise HTTPException(status_code=oe.status_code, detail=str(oe), headers={"Retry-After": str(oe.retry_after)})
+    except HTTPException:
+        raise
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.post("/api/jobs", response_class=JSONResponse, status_code=202)
+async def create_job_api(payload: Dict[str, Any] = Body(...), fresh: bool = False, sectioned: bool = False):
+    """
+    Queue a script generation and return its job ID at once. The body is a
+    ScriptRequest, or a YouTubeChannelRequest (with channel_id) to use the
+    channel's tone. Poll GET /api/jobs/{id} for the result.
+    """
+    job_type = "channel" if "channel_id" in payload else "script"
+    try:
+        request = (YouTubeChannelRequest if job_type == "channel" else ScriptRequest)(**payload)
+    except ValidationError as ve:
+        raise HTTPException(status_code=422, detail=ve.errors())
+
+    try:
+        job_id = job_queue.enqueue(job_type, {**request.dict(), "fresh": fresh, "sectioned": sectioned})
+    except QueueFull as qf:
+        raise HTTPException(status_code=503, detail=str(qf), headers={"Retry-After": "30"})
+    return {"id": job_id, "status": "queued", "status_url": f"/api/jobs/{job_id}"}
+
+
+@app.get("/api/jobs/{job_id}", response_class=JSONResponse)
+async def get_job_api(job_id: str):
+    """Status of a queued job (queued, running, done or failed), with its result or error once finished"""
+    job = job_queue.store.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+
+@app.get("/api/cache-stats", response_class=JSONResponse)
+async def cache_stats_api():
+    """Hit/miss counters for the channel and script caches, plus request coalescing counts"""
+    return {
+        "channel": channel_cache.stats(),
+        "script": script_cache.stats(),
+        "similar_script": similar_scripts.stats(),
+        "channel_index": channel_index.stats(),
+        "coalesced": {"channel": channel_flights.stats(), "script": script_flights.stats()}
+    }
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics_api():
+    """Prometheus metrics: stage and request latency histograms, upstream call/error/quota counters"""
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
+
+
+@app.get("/api/llm-backends", response_class=JSONResponse)
+async def llm_backends_api():
+    """Per-backend LLM call counts, latency percentiles, hedge wins and circuit breaker state"""
+    return llm_router.stats()
+
+
+@app.get("/api/admission", response_class=JSONResponse)
+async def admission_api():
+    """Running and waiting requests per upstream across workers, with limits and this worker's shed counts"""
+    return admission.stats()
+
+
+@app.get("/api/quota", response_class=JSONResponse)
+async def quota_api():
+    """YouTube Data API units spent today against the daily budget"""
+    return youtube_quota.stats()
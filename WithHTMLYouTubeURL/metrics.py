@@ -0,0 +1,156 @@
+"""
+Lightweight in-process metrics: Prometheus-format histograms and counters for
+the /metrics endpoint, plus per-request stage timings for the Server-Timing
+header. Recording is a perf_counter read, a bisect and a few dict updates, so it
+is cheap enough to leave on. Values are per worker process.
+"""
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+def _labels(names: Tuple[str, ...], values: Tuple[str, ...], extra: str = "") -> str:
+    pairs = [f'{name}="{value}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Counter:
+    """Monotonic counter with one series per label-value tuple"""
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, *labels: str, amount: float = 1):
+        self._values[labels] = self._values.get(labels, 0) + amount
+
+    def value(self, *labels: str) -> float:
+        return self._values.get(labels, 0)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        for labels, value in sorted(self._values.items()):
+            lines.append(f"{self.name}{_labels(self.labelnames, labels)} {value}")
+        return lines
+
+
+class Histogram:
+    """Histogram with fixed buckets and one series per label-value tuple"""
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = (),
+                 buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.buckets = buckets
+        # labels -> [per-bucket counts (last is +Inf), sum, count]
+        self._series: Dict[Tuple[str, ...], list] = {}
+
+    def observe(self, *labels: str, value: float):
+        series = self._series.get(labels)
+        if series is None:
+            series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+        series[0][bisect_left(self.buckets, value)] += 1
+        series[1] += value
+        series[2] += 1
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        for labels, (counts, total, count) in sorted(self._series.items()):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                bucket_labels = _labels(self.labelnames, labels, f'le="{le}"')
+                lines.append(f"{self.name}_bucket{bucket_labels} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, labels)} {total}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, labels)} {count}")
+        return lines
+
+
+class Gauge:
+    """Point-in-time values read at scrape time from `collect`, which returns label-value tuple -> value"""
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = (),
+                 collect: Optional[Callable[[], Dict[Tuple[str, ...], float]]] = None):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.collect = collect
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} gauge"]
+        for labels, value in sorted((self.collect() if self.collect else {}).items()):
+            lines.append(f"{self.name}{_labels(self.labelnames, labels)} {value}")
+        return lines
+
+
+REQUEST_DURATION = Histogram("http_request_duration_seconds", "Time to produce a response, by route.",
+                             ("method", "route", "status"))
+STAGE_DURATION = Histogram("stage_duration_seconds", "Time spent in each hot-path stage.", ("stage",))
+UPSTREAM_CALLS = Counter("upstream_calls_total", "Outbound HTTP calls, by upstream and endpoint.",
+                         ("upstream", "endpoint"))
+UPSTREAM_ERRORS = Counter("upstream_errors_total", "Failed outbound HTTP calls, by upstream and endpoint.",
+                          ("upstream", "endpoint"))
+YOUTUBE_QUOTA_UNITS = Counter("youtube_quota_units_total", "Estimated YouTube Data API quota units spent.",
+                              ("endpoint",))
+LLM_BACKEND_DURATION = Histogram("llm_backend_duration_seconds", "LLM call duration, by backend and outcome.",
+                                 ("backend", "outcome"))
+LLM_HEDGES = Counter("llm_hedges_total", "Hedged LLM requests, by the slow backend that triggered them.",
+                     ("backend",))
+LLM_TOKENS = Counter("llm_tokens_total", "LLM tokens: max_tokens requested, and prompt and completion tokens used.",
+                     ("kind",))
+LLM_CONTINUATIONS = Counter("llm_continuations_total", "LLM replies cut off at max_tokens and continued.")
+ADMISSION_QUEUE_DEPTH = Gauge("admission_requests", "Requests holding or waiting for an upstream slot, "
+                              "across workers.", ("upstream", "state"))
+ADMISSION_SHED = Counter("admission_shed_total", "Requests rejected by admission control, by upstream and reason.",
+                         ("upstream", "reason"))
+ADMISSION_WAIT = Histogram("admission_wait_seconds", "Time admitted requests waited for an upstream slot.",
+                           ("upstream",))
+
+REGISTRY = [REQUEST_DURATION, STAGE_DURATION, UPSTREAM_CALLS, UPSTREAM_ERRORS, YOUTUBE_QUOTA_UNITS,
+            LLM_BACKEND_DURATION, LLM_HEDGES, LLM_TOKENS, LLM_CONTINUATIONS, ADMISSION_QUEUE_DEPTH, ADMISSION_SHED, ADMISSION_WAIT]
+
+# Stage name -> accumulated seconds for the request being handled
+request_timings: ContextVar[Optional[Dict[str, float]]] = ContextVar("request_timings", default=None)
+
+
+def record_stage(stage: str, seconds: float):
+    """Add a stage duration to the histogram and to the current request's timings"""
+    STAGE_DURATION.observe(stage, value=seconds)
+    timings = request_timings.get()
+    if timings is not None:
+        timings[stage] = timings.get(stage, 0.0) + seconds
+
+
+@contextmanager
+def timed(stage: str) -> Iterator[None]:
+    """Time the enclosed block (sync or async code) as `stage`"""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_stage(stage, time.perf_counter() - started)
+
+
+def server_timing_header(timings: Dict[str, float], total: float) -> str:
+    """Format stage timings as a Server-Timing header value (durations in ms)"""
+    entries = [f"{stage};dur={seconds * 1000:.1f}" for stage, seconds in timings.items()]
+    entries.append(f"total;dur={total * 1000:.1f}")
+    return ", ".join(entries)
+
+
+def render_metrics() -> str:
+    """All registered metrics in the Prometheus text exposition format"""
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
@@ -1,5 +1,5 @@
 from pydantic import BaseModel, Field
-from typing import Optional, List
+from typing import Optional, List, Dict
 
 class ScriptRequest(BaseModel):
     topic: str
@@ -19,6 +19,9 @@ class YouTubeChannelRequest(BaseModel):
     language: Optional[str] = "English"
     notes: Optional[str] = ""
     
+class BulkChannelRequest(BaseModel):
+    channel_ids: List[str]  # channel IDs or URLs
+    
 class ChannelInfo(BaseModel):
     id: str
     title: str
@@ -33,4 +36,5 @@ class ChannelInfo(BaseModel):
     
 class ToneAnalysisResult(BaseModel):
     primary_tone: str
-    secondary_tones: List[str] = []
\ No newline at end of file
+    secondary_tones: List[str] = []
+    scores: Dict[str, float] = {}  # tone -> (weighted) keyword hits, highest first
\ No newline at end of file
@@ -1,15 +1,13 @@
+from budget import NOTES_MAX_TOKENS, script_size, speech_rate, trim_to_tokens
+
+
 def build_prompt(data):
     return f"""
 You are a professional YouTube script writer. Based on the inputs below, generate a full script.
 
-Inputs:
-Topic: {data.topic}
-Tone: {data.tone}
-Style: {data.style}
-Duration: {data.duration} minutes
-Target Audience: {data.audience}
-Language: {data.language}
-Additional Notes: {data.notes}
+{_inputs(data)}
+
+Length: about {script_size(data)} {speech_rate(data.language).unit} of spoken script in total, to fit {data.duration} minutes.
 
 Output format:
 1. Script Structure (with timestamps)
@@ -20,3 +18,67 @@ Output format:
 
 Write naturally, clearly, and engagingly. Do not include anything outside the specified format.
 """
+
+
+def _inputs(data):
+    return f"""Inputs:
+Topic: {data.topic}
+Tone: {data.tone}
+Style: {data.style}
+Duration: {data.duration} minutes
+Target Audience: {data.audience}
+Language: {data.language}
+Additional Notes: {trim_to_tokens(data.notes, NOTES_MAX_TOKENS)}"""
+
+
+def build_outline_prompt(data):
+    """First step of sectioned generation: a short outline that every section follows"""
+    return f"""
+You are a professional YouTube script writer. Based on the inputs below, plan a script. Do not write the script yet.
+
+{_inputs(data)}
+
+Reply with JSON only, in this shape:
+{{
+  "structure": "Script Structure: one line per part with its timestamp (hook, 3 chapters, engagement moment), fitting {data.duration} minutes",
+  "hook": "one sentence describing the hook",
+  "chapters": [
+    {{"title": "chapter title", "summary": "one or two sentences on what the chapter covers"}}
+  ],
+  "engagement": "one sentence describing the engagement moment (question, twist, or CTA) and where it goes"
+}}
+Use exactly 3 chapters.
+"""
+
+
+def build_section_prompt(data, outline, section, size):
+    """Write one part of the script (hook, a chapter, or the engagement moment) from the outline"""
+    chapters = "\n".join(f"{index}. {chapter['title']}: {chapter['summary']}"
+                         for index, chapter in enumerate(outline["chapters"], start=1))
+    return f"""
+You are a professional YouTube script writer. You are writing one part of a script; other writers are writing the other parts from the same outline.
+
+{_inputs(data)}
+
+Outline:
+{outline["structure"]}
+Hook: {outline["hook"]}
+Chapters:
+{chapters}
+Engagement Moment: {outline["engagement"]}
+
+Write only this part: {section}
+Length: about {size} {speech_rate(data.language).unit} of spoken script.
+Write naturally, clearly, and engagingly, in {data.language}. Do not include a heading or anything outside this part.
+"""
+
+
+def build_scorecard_prompt(data, script):
+    """Last step of sectioned generation: rate the stitched script"""
+    return f"""
+You are a YouTube content strategist. Rate the script below for the topic "{data.topic}" and the audience "{data.audience}".
+
+{script}
+
+Reply with only the scorecard, in about 60 words: Clickability, SEO Strength, Clarity & Relevance, each rated from 0 to 10 with a one-line reason.
+"""
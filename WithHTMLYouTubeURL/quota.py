@@ -0,0 +1,202 @@
+import math
+import asyncio
+import sqlite3
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterator, Optional
+from zoneinfo import ZoneInfo
+
+# The Data API quota resets at midnight Pacific Time
+QUOTA_TIMEZONE = ZoneInfo("America/Los_Angeles")
+# Data API quota cost of one call to each list endpoint
+QUOTA_COSTS = {'search': 100, 'channels': 1, 'playlistItems': 1, 'videos': 1}
+# The Data API caps list calls at 50 items/IDs per request
+MAX_RESULTS_PER_PAGE = 50
+
+
+class QuotaExceeded(Exception):
+    """
+    Raised instead of calling the API when a call would exceed the daily or request
+    budget. retry_after is the seconds until the daily quota resets, or None when the
+    request's own budget is too small, which retrying can't fix (400 rather than 429).
+    """
+
+    def __init__(self, message: str, retry_after: Optional[int]):
+        super().__init__(message)
+        self.retry_after = retry_after
+        self.status_code = 429 if retry_after is not None else 400
+
+    @property
+    def headers(self) -> Dict[str, str]:
+        """Retry-After, if retrying later can succeed"""
+        return {"Retry-After": str(self.retry_after)} if self.retry_after is not None else {}
+
+
+class RequestQuota:
+    """Units a single request may spend, and how many it has spent"""
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.spent = 0
+
+    @property
+    def remaining(self) -> int:
+        return self.limit - self.spent
+
+
+# Budget of the request currently being handled, if the caller set one
+request_quota: ContextVar[Optional[RequestQuota]] = ContextVar("request_quota", default=None)
+
+
+@contextmanager
+def quota_budget(units: Optional[int]) -> Iterator[Optional[RequestQuota]]:
+    """Limit the YouTube quota spent inside the block to `units` (None for no per-request limit)"""
+    budget = RequestQuota(units) if units is not None else None
+    token = request_quota.set(budget)
+    try:
+        yield budget
+    finally:
+        request_quota.reset(token)
+
+
+def channel_fetch_cost(max_videos: int) -> int:
+    """Units for get_channel_info: one channels call plus a playlistItems and a videos call per 50 videos"""
+    pages = max(1, math.ceil(max_videos / MAX_RESULTS_PER_PAGE))
+    return QUOTA_COSTS['channels'] + pages * (QUOTA_COSTS['playlistItems'] + QUOTA_COSTS['videos'])
+
+
+class QuotaManager:
+    """
+    Tracks the YouTube Data API units spent today against a global daily budget.
+
+    The running total is kept per Pacific-time day in SQLite when db_path is set,
+    so it survives restarts and is shared by every worker using the same file.
+    """
+
+    def __init__(self, daily_limit: int, db_path: Optional[str] = None,
+                 reduce_below: float = 0.2, cache_only_below: float = 0.05):
+        self.daily_limit = daily_limit
+        # Fractions of the daily budget left at which get_channel_info degrades
+        self.reduce_below = reduce_below
+        self.cache_only_below = cache_only_below
+        self.rejected = 0
+        self._lock = threading.Lock()
+        self._memory: Dict[str, int] = {}
+        self._conn = None
+        if db_path:
+            self._conn = sqlite3.connect(db_path, timeout=10, isolation_level=None, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS youtube_quota (day TEXT PRIMARY KEY, units INTEGER NOT NULL)"
+            )
+
+    @staticmethod
+    def _today() -> str:
+        return datetime.now(QUOTA_TIMEZONE).date().isoformat()
+
+    @staticmethod
+    def seconds_until_reset() -> int:
+        now = datetime.now(QUOTA_TIMEZONE)
+        midnight = datetime.combine(now.date() + timedelta(days=1), datetime.min.time(), QUOTA_TIMEZONE)
+        return max(1, int((midnight - now).total_seconds()))
+
+    def used(self) -> int:
+        """Units spent so far today"""
+        day = self._today()
+        with self._lock:
+            if self._conn is None:
+                return self._memory.get(day, 0)
+            row = self._conn.execute("SELECT units FROM youtube_quota WHERE day = ?", (day,)).fetchone()
+            return row[0] if row else 0
+
+    def remaining(self) -> int:
+        """Units left today, also capped by the current request's budget"""
+        remaining = self.daily_limit - self.used()
+        budget = request_quota.get()
+        if budget is not None:
+            remaining = min(remaining, budget.remaining)
+        return max(0, remaining)
+
+    def _increment(self, day: str, units: int) -> bool:
+        """Add units to the day's total unless that would exceed the daily limit"""
+        with self._lock:
+            if self._conn is None:
+                used = self._memory.get(day, 0)
+                if used + units > self.daily_limit:
+                    return False
+                self._memory = {day: used + units}
+                return True
+            # Conditional increment, so concurrent workers can't overshoot the limit
+            self._conn.execute("INSERT OR IGNORE INTO youtube_quota (day, units) VALUES (?, 0)", (day,))
+            return self._conn.execute(
+                "UPDATE youtube_quota SET units = units + ? WHERE day = ? AND units + ? <= ?",
+                (units, day, units, self.daily_limit)
+            ).rowcount > 0
+
+    async def charge(self, resource: str):
+        """
+        Record the cost of one call, or raise QuotaExceeded if it doesn't fit the budgets.
+        The shared database is updated in a thread, so a lock held by another worker
+        never stalls the event loop.
+        """
+        units = QUOTA_COSTS.get(resource, 1)
+        budget = request_quota.get()
+        if budget is not None and units > budget.remaining:
+            self.rejected += 1
+            raise QuotaExceeded(f"Request quota budget of {budget.limit} units exhausted", None)
+
+        # Reserved before waiting, so concurrent calls of the request can't overspend it
+        if budget is not None:
+            budget.spent += units
+        day = self._today()
+        if self._conn is None:
+            charged = self._increment(day, units)
+        else:
+            charged = await asyncio.shield(asyncio.to_thread(self._increment, day, units))
+        if not charged:
+            if budget is not None:
+                budget.spent -= units
+            self.rejected += 1
+            raise QuotaExceeded("Daily YouTube API quota exhausted", self.seconds_until_reset())
+
+    def daily_exhausted(self) -> bool:
+        """Whether the daily budget (rather than the request's) leaves nothing for a channel fetch"""
+        left = self.daily_limit - self.used()
+        left_fraction = left / self.daily_limit if self.daily_limit else 0
+        return left_fraction < self.cache_only_below or left < channel_fetch_cost(1)
+
+    def uncached_error(self) -> QuotaExceeded:
+        """The error for a channel that isn't cached when plan() allows no fetch"""
+        budget = request_quota.get()
+        if budget is None or self.daily_exhausted():
+            return QuotaExceeded("YouTube API quota is nearly used up and this channel is not cached",
+                                 self.seconds_until_reset())
+        return QuotaExceeded(f"Request quota budget of {budget.limit} units is too small to fetch this channel", None)
+
+    def plan(self, max_videos: int, reduced_videos: int) -> Optional[int]:
+        """
+        How many videos get_channel_info may fetch right now: max_videos normally,
+        reduced_videos when the budget is running low, or None when only cached
+        data should be served.
+        """
+        remaining = self.remaining()
+        left_fraction = (self.daily_limit - self.used()) / self.daily_limit if self.daily_limit else 0
+        if left_fraction < self.cache_only_below or remaining < channel_fetch_cost(1):
+            return None
+        if left_fraction < self.reduce_below or remaining < channel_fetch_cost(max_videos):
+            fitting_pages = (remaining - QUOTA_COSTS['channels']) // (QUOTA_COSTS['playlistItems'] + QUOTA_COSTS['videos'])
+            return max(1, min(max_videos, reduced_videos, fitting_pages * MAX_RESULTS_PER_PAGE))
+        return max_videos
+
+    def stats(self) -> Dict[str, Any]:
+        used = self.used()
+        return {
+            "day": self._today(),
+            "used": used,
+            "daily_limit": self.daily_limit,
+            "remaining": max(0, self.daily_limit - used),
+            "rejected_calls": self.rejected,
+            "resets_in_seconds": self.seconds_until_reset()
+        }
@@ -0,0 +1,72 @@
+import asyncio
+import time
+from contextvars import ContextVar
+from typing import Any, Awaitable, Callable, Optional
+from budget import CHARS_PER_TOKEN
+
+
+def estimate_tokens(prompt: str, max_tokens: int) -> int:
+    """Prompt tokens plus the reply's max_tokens, which upstream token rate limits reserve up front"""
+    return len(prompt) // CHARS_PER_TOKEN + max_tokens
+
+
+class TokenBucket:
+    """
+    Async token bucket refilled continuously at `per_minute` units per minute,
+    holding at most `per_minute` units. Waiters are served in arrival order.
+    """
+
+    def __init__(self, per_minute: float):
+        self.capacity = float(per_minute)
+        self.rate = per_minute / 60.0
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def acquire(self, amount: float = 1):
+        """Wait until `amount` units are available and take them"""
+        # A single request larger than the whole budget waits for a full bucket
+        amount = min(amount, self.capacity)
+        async with self._lock:
+            self._refill()
+            while self._tokens < amount:
+                await asyncio.sleep((amount - self._tokens) / self.rate)
+                self._refill()
+            self._tokens -= amount
+
+
+class RateLimitedScheduler:
+    """Run coroutines with bounded concurrency under requests- and tokens-per-minute budgets"""
+
+    def __init__(self, concurrency: int, requests_per_minute: float, tokens_per_minute: float):
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._requests = TokenBucket(requests_per_minute)
+        self._tokens = TokenBucket(tokens_per_minute)
+
+    async def run(self, call: Callable[[], Awaitable[Any]], tokens: int = 0) -> Any:
+        """
+        Wait for a concurrency slot and enough budget, then await call(). Follow-up
+        requests made by call() are charged through current_scheduler.
+        """
+        async with self._semaphore:
+            await self.charge(tokens)
+            reset = current_scheduler.set(self)
+            try:
+                return await call()
+            finally:
+                current_scheduler.reset(reset)
+
+    async def charge(self, tokens: int = 0):
+        """Wait for budget for one more request of about `tokens` tokens and take it"""
+        await self._requests.acquire(1)
+        if tokens:
+            await self._tokens.acquire(tokens)
+
+
+# Scheduler whose budgets the running call is under (None outside RateLimitedScheduler.run)
+current_scheduler: ContextVar[Optional[RateLimitedScheduler]] = ContextVar("current_scheduler", default=None)
@@ -0,0 +1,84 @@
+import os
+import re
+import json
+import hashlib
+from typing import Any, Dict, Optional
+from cache import make_cache
+from groq_client import TEMPERATURE, router
+from models import ScriptRequest
+from similar_cache import SimilarIndex
+
+# Fields of ScriptRequest that determine the generated script
+SCRIPT_KEY_FIELDS = ("topic", "tone", "style", "duration", "audience", "language", "notes")
+
+# Generated scripts keyed by request hash. Set SCRIPT_CACHE_DB to a file path
+# to persist them and share them between workers.
+script_cache = make_cache(
+    max_entries=int(os.getenv("SCRIPT_CACHE_SIZE", "1024")),
+    ttl=float(os.getenv("SCRIPT_CACHE_TTL", "86400")),
+    db_path=os.getenv("SCRIPT_CACHE_DB") or None,
+    table="script_cache",
+    max_bytes=int(os.getenv("SCRIPT_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+)
+
+
+def _normalize(value: Any) -> Any:
+    """Case-fold strings and collapse runs of whitespace"""
+    if isinstance(value, str):
+        return re.sub(r"\s+", " ", value).strip().casefold()
+    return value
+
+
+def normalize_request(data: ScriptRequest) -> Dict[str, Any]:
+    """The ScriptRequest fields that matter for the output, normalized"""
+    return {field: _normalize(getattr(data, field)) for field in SCRIPT_KEY_FIELDS}
+
+
+# Scripts from any configured backend may answer a request, so all their models go into the key
+ROUTED_MODELS = ",".join(backend.model for backend in router.backends)
+
+
+def script_cache_key(data: ScriptRequest, model: str = ROUTED_MODELS, temperature: float = TEMPERATURE,
+                     mode: Optional[str] = None) -> str:
+    """SHA-256 of the normalized request plus the model settings and generation mode (None: single prompt)"""
+    fields = normalize_request(data)
+    fields["model"] = model
+    fields["temperature"] = temperature
+    if mode:
+        fields["mode"] = mode
+    return hashlib.sha256(json.dumps(fields, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+# Requests whose topic and notes are near-duplicates of a cached one (same tone, style,
+# duration, audience and language) reuse its script; see similar_cache.py. The index
+# is stored next to the scripts in SCRIPT_CACHE_DB. SIMILAR_CACHE_SIZE=0 turns it off.
+# SIMILAR_CACHE_THRESHOLD is the Jaccard similarity of the topic words (and of the notes
+# words) needed for a hit: 0.75 lets one extra word in four through, 1.0 only matches
+# rewordings with the same words. Negations, numbers and model variants never differ.
+SIMILAR_CACHE_SIZE = int(os.getenv("SIMILAR_CACHE_SIZE", "10000"))
+similar_scripts = SimilarIndex(
+    max_entries=SIMILAR_CACHE_SIZE,
+    threshold=float(os.getenv("SIMILAR_CACHE_THRESHOLD", "0.75")),
+    db_path=(os.getenv("SCRIPT_CACHE_DB") or None) if SIMILAR_CACHE_SIZE else None
+)
+
+
+def similar_bucket(data: ScriptRequest, model: str = ROUTED_MODELS, temperature: float = TEMPERATURE,
+                   mode: Optional[str] = None) -> str:
+    """Like script_cache_key, but without the topic and notes, which are matched by similarity"""
+    fields = {field: value for field, value in normalize_request(data).items() if field not in ("topic", "notes")}
+    fields.update(model=model, temperature=temperature, mode=mode)
+    return hashlib.sha256(json.dumps(fields, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+def find_similar_script(data: ScriptRequest, mode: Optional[str] = None) -> Optional[str]:
+    """A cached script for a near-duplicate of the request, or None"""
+    if not SIMILAR_CACHE_SIZE:
+        return None
+    return similar_scripts.get(similar_bucket(data, mode=mode), data.topic, data.notes, script_cache.get)
+
+
+def index_script(key: str, data: ScriptRequest, mode: Optional[str] = None):
+    """Make the script cached under key findable by near-duplicate requests"""
+    if SIMILAR_CACHE_SIZE:
+        similar_scripts.add(key, similar_bucket(data, mode=mode), data.topic, data.notes)
@@ -0,0 +1,92 @@
+"""
+Sectioned script generation: a short outline first, then the hook, each chapter
+and the engagement moment as concurrent LLM calls, stitched into the same
+output format as build_prompt, with the scorecard rated last.
+
+Each call writes a fraction of the script, so for long scripts the wall-clock
+time is roughly that of the longest section instead of the whole script.
+"""
+import json
+import asyncio
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List
+from budget import output_tokens, script_size
+from groq_client import get_script
+from metrics import timed
+from prompts import build_outline_prompt, build_section_prompt, build_scorecard_prompt
+
+# Share of the script's length given to the hook and the engagement moment; the
+# chapters split the rest
+HOOK_SHARE = 0.08
+ENGAGEMENT_SHARE = 0.07
+# max_tokens for the outline and the scorecard
+OUTLINE_MAX_TOKENS = 600
+SCORECARD_MAX_TOKENS = 200
+
+# complete(prompt, max_tokens) returns the reply
+Complete = Callable[[str, int], Awaitable[str]]
+
+
+def parse_outline(text: str) -> Dict[str, Any]:
+    """The outline JSON from the model's reply (tolerating text or code fences around it)"""
+    try:
+        outline = json.loads(text[text.index("{"):text.rindex("}") + 1])
+        chapters = [{"title": str(chapter["title"]), "summary": str(chapter.get("summary", ""))}
+                    for chapter in outline["chapters"]][:3]
+        if not chapters:
+            raise ValueError("no chapters")
+        return {
+            "structure": str(outline["structure"]),
+            "hook": str(outline["hook"]),
+            "chapters": chapters,
+            "engagement": str(outline["engagement"])
+        }
+    except (ValueError, KeyError, TypeError) as e:
+        raise ValueError(f"Could not parse the script outline: {str(e)}")
+
+
+async def iter_sectioned_script(data, complete: Complete = get_script) -> AsyncIterator[str]:
+    """
+    Yield the script part by part, in output order, as soon as each part and
+    the ones before it are ready.
+    """
+    with timed("outline"):
+        outline = parse_outline(await complete(build_outline_prompt(data), OUTLINE_MAX_TOKENS))
+
+    size = script_size(data)
+    chapter_size = int(size * (1 - HOOK_SHARE - ENGAGEMENT_SHARE) / len(outline["chapters"]))
+    sections = [("the Hook", max(30, int(size * HOOK_SHARE)))]
+    sections += [(f"Chapter {index}: {chapter['title']}", chapter_size)
+                 for index, chapter in enumerate(outline["chapters"], start=1)]
+    sections.append(("the Engagement Moment", max(30, int(size * ENGAGEMENT_SHARE))))
+
+    tasks: List[asyncio.Task] = [
+        asyncio.create_task(complete(build_section_prompt(data, outline, section, section_size),
+                                     output_tokens(data.language, section_size)))
+        for section, section_size in sections
+    ]
+    try:
+        parts = [f"1. Script Structure (with timestamps)\n{outline['structure'].strip()}\n\n"]
+        yield parts[0]
+
+        hook, *chapters, engagement = tasks
+        parts.append(f"2. Hook\n{(await hook).strip()}\n\n3. Chapters\n")
+        yield parts[-1]
+        for index, (chapter, task) in enumerate(zip(outline["chapters"], chapters), start=1):
+            parts.append(f"Chapter {index}: {chapter['title']}\n{(await task).strip()}\n\n")
+            yield parts[-1]
+        parts.append(f"4. Engagement Moment\n{(await engagement).strip()}\n\n")
+        yield parts[-1]
+
+        with timed("scorecard"):
+            scorecard = await complete(build_scorecard_prompt(data, "".join(parts)), SCORECARD_MAX_TOKENS)
+        yield f"5. Scorecard\n{scorecard.strip()}\n"
+    finally:
+        # Stop the remaining sections if the caller stops early or a section failed
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+async def generate_sectioned_script(data, complete: Complete = get_script) -> str:
+    """The whole sectioned script as one string"""
+    return "".join([part async for part in iter_sectioned_script(data, complete)])
@@ -0,0 +1,224 @@
+"""
+Near-duplicate lookup for script requests: "10 python tips" and "Ten Python tips
+for beginners" should be able to share a script when everything else matches.
+
+Topics and notes are reduced to sets of normalized words. MinHash signatures of
+the topic words go into LSH bands, so finding candidates is a few dict lookups
+however many requests are indexed. A candidate is only returned if the exact
+Jaccard similarity of its topic words, and of its notes words, reaches the
+threshold, so the MinHash estimate never decides a hit by itself.
+
+Words that change what a script is about must match exactly whatever the
+similarity: negations ("learn Rust" vs "don't learn Rust"), numbers and years
+("in 2023" vs "in 2024") and model variants ("iPhone 15" vs "iPhone 15 Pro").
+
+The index holds keys into script_cache, not scripts, and evicts the least
+recently used requests beyond max_entries.
+"""
+import re
+import time
+import sqlite3
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, FrozenSet, List, Optional, Set, Tuple
+
+NUMBER_WORDS = {
+    "one": "1", "two": "2", "three": "3", "four": "4", "five": "5", "six": "6", "seven": "7", "eight": "8",
+    "nine": "9", "ten": "10", "eleven": "11", "twelve": "12", "fifteen": "15", "twenty": "20", "thirty": "30",
+    "fifty": "50", "hundred": "100"
+}
+STOP_WORDS = {"a", "an", "the", "and", "or", "of", "to", "for", "in", "on", "at", "with", "about", "your", "my", "our"}
+# Words that may only differ between requests that want different scripts, along
+# with any word containing a digit
+NEGATION_WORDS = {"not", "no", "never", "without", "none", "nothing", "nor", "cannot", "avoid", "stop"}
+VARIANT_WORDS = {"pro", "max", "mini", "plus", "ultra", "lite", "air", "se", "xl", "xs", "fe"}
+
+# Mersenne prime for the MinHash permutations h -> (a * h + b) mod p
+_PRIME = (1 << 61) - 1
+
+
+def tokenize(text: str) -> FrozenSet[str]:
+    """Words of the text, case-folded, numbers as digits, "n't" as "not", naive singular, stop words dropped"""
+    words = set()
+    text = re.sub(r"n['’]t\b", " not", text.casefold())
+    for word in re.findall(r"[^\W_]+", text):
+        word = NUMBER_WORDS.get(word, word)
+        if word in STOP_WORDS:
+            continue
+        if len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+            word = word[:-1]
+        words.add(word)
+    return frozenset(words)
+
+
+def jaccard(a: FrozenSet[str], b: FrozenSet[str]) -> float:
+    if not a and not b:
+        return 1.0
+    return len(a & b) / len(a | b)
+
+
+def distinguishing(a: FrozenSet[str], b: FrozenSet[str]) -> bool:
+    """Whether the word sets differ in a negation, a number or a model variant"""
+    return any(word in NEGATION_WORDS or word in VARIANT_WORDS or any(c.isdigit() for c in word)
+               for word in a ^ b)
+
+
+def _hash(value: str) -> int:
+    return int.from_bytes(hashlib.blake2b(value.encode("utf-8"), digest_size=8).digest(), "big")
+
+
+class SimilarIndex:
+    """
+    MinHash/LSH index of (bucket, topic, notes) -> key. Only entries in the same
+    bucket (the fields that must match exactly) are compared.
+
+    With db_path the entries are kept in SQLite too, so they survive restarts and
+    entries added by other workers sharing the file are picked up on lookup.
+    """
+
+    def __init__(self, max_entries: int = 10000, threshold: float = 0.75, bands: int = 8, rows: int = 4,
+                 db_path: Optional[str] = None, table: str = "similar_index"):
+        self.max_entries = max_entries
+        self.threshold = threshold
+        self.bands = bands
+        self.rows = rows
+        self.hits = 0
+        self.misses = 0
+        seeds = [_hash(f"minhash:{i}") for i in range(bands * rows)]
+        self._permutations = [(seed % (_PRIME - 1) + 1, (seed >> 3) % _PRIME) for seed in seeds]
+        # key -> (bucket, topic words, notes words, band hashes), least recently used first
+        self._entries: "OrderedDict[str, Tuple[str, FrozenSet[str], FrozenSet[str], List[int]]]" = OrderedDict()
+        # (bucket, band, band hash) -> keys
+        self._buckets: Dict[Tuple[str, int, int], Set[str]] = {}
+        self._table = table
+        self._conn = None
+        self._lock = threading.Lock()
+        self._synced_rowid = 0
+        if db_path:
+            self._conn = sqlite3.connect(db_path, timeout=10, isolation_level=None, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                f"CREATE TABLE IF NOT EXISTS {table} ("
+                "key TEXT PRIMARY KEY, bucket TEXT NOT NULL, topic TEXT NOT NULL, notes TEXT NOT NULL, "
+                "accessed_at REAL NOT NULL)"
+            )
+            self._sync()
+
+    def _band_hashes(self, words: FrozenSet[str]) -> List[int]:
+        """MinHash signature of the words, folded into one hash per LSH band"""
+        hashes = [_hash(word) for word in words] or [0]
+        signature = [min((a * h + b) % _PRIME for h in hashes) for a, b in self._permutations]
+        return [hash(tuple(signature[band * self.rows:(band + 1) * self.rows])) for band in range(self.bands)]
+
+    def _insert(self, key: str, bucket: str, topic: FrozenSet[str], notes: FrozenSet[str]) -> List[str]:
+        """Index an entry in memory and return the keys evicted to make room"""
+        self._remove(key)
+        band_hashes = self._band_hashes(topic)
+        self._entries[key] = (bucket, topic, notes, band_hashes)
+        for band, band_hash in enumerate(band_hashes):
+            self._buckets.setdefault((bucket, band, band_hash), set()).add(key)
+        evicted = []
+        while len(self._entries) > self.max_entries:
+            oldest = next(iter(self._entries))
+            self._remove(oldest)
+            evicted.append(oldest)
+        return evicted
+
+    def _remove(self, key: str):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        bucket, _, _, band_hashes = entry
+        for band, band_hash in enumerate(band_hashes):
+            keys = self._buckets.get((bucket, band, band_hash))
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._buckets[(bucket, band, band_hash)]
+
+    def _sync(self):
+        """Load entries written to the database since the last sync (by any worker)"""
+        rows = self._conn.execute(
+            f"SELECT rowid, key, bucket, topic, notes FROM {self._table} WHERE rowid > ? ORDER BY accessed_at",
+            (self._synced_rowid,)
+        ).fetchall()
+        for rowid, key, bucket, topic, notes in rows:
+            self._synced_rowid = max(self._synced_rowid, rowid)
+            self._insert(key, bucket, frozenset(topic.split()), frozenset(notes.split()))
+
+    def add(self, key: str, bucket: str, topic: str, notes: str = ""):
+        """Index a stored script's key under its request's bucket, topic and notes"""
+        topic_words, notes_words = tokenize(topic), tokenize(notes)
+        with self._lock:
+            evicted = self._insert(key, bucket, topic_words, notes_words)
+            if self._conn is None:
+                return
+            self._conn.execute(
+                f"INSERT OR REPLACE INTO {self._table} (key, bucket, topic, notes, accessed_at) VALUES (?, ?, ?, ?, ?)",
+                (key, bucket, " ".join(sorted(topic_words)), " ".join(sorted(notes_words)), time.time())
+            )
+            self._conn.executemany(f"DELETE FROM {self._table} WHERE key = ?", [(k,) for k in evicted])
+            self._conn.execute(
+                f"DELETE FROM {self._table} WHERE key IN ("
+                f"SELECT key FROM {self._table} ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,)
+            )
+
+    def find(self, bucket: str, topic: str, notes: str = "") -> List[Tuple[float, str]]:
+        """(similarity, key) of indexed entries at or above the threshold, most similar first"""
+        topic_words, notes_words = tokenize(topic), tokenize(notes)
+        with self._lock:
+            if self._conn is not None:
+                self._sync()
+            candidates = set()
+            for band, band_hash in enumerate(self._band_hashes(topic_words)):
+                candidates |= self._buckets.get((bucket, band, band_hash), set())
+            matches = []
+            for key in candidates:
+                _, other_topic, other_notes, _ = self._entries[key]
+                if distinguishing(topic_words, other_topic) or distinguishing(notes_words, other_notes):
+                    continue
+                similarity = min(jaccard(topic_words, other_topic), jaccard(notes_words, other_notes))
+                if similarity >= self.threshold:
+                    matches.append((similarity, key))
+            matches.sort(reverse=True)
+            if matches:
+                self._entries.move_to_end(matches[0][1])
+        return matches
+
+    def get(self, bucket: str, topic: str, notes: str, load: Callable[[str], Optional[Any]]) -> Optional[Any]:
+        """
+        The value load(key) of the most similar entry that still has one, or None.
+        Entries whose value is gone (evicted or expired) are dropped from the index.
+        """
+        for _, key in self.find(bucket, topic, notes):
+            value = load(key)
+            if value is not None:
+                self.hits += 1
+                return value
+            self.discard(key)
+        self.misses += 1
+        return None
+
+    def discard(self, key: str):
+        """Forget an entry whose script is gone"""
+        with self._lock:
+            self._remove(key)
+            if self._conn is not None:
+                self._conn.execute(f"DELETE FROM {self._table} WHERE key = ?", (key,))
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "backend": "sqlite" if self._conn is not None else "memory",
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            "size": len(self),
+            "max_entries": self.max_entries,
+            "threshold": self.threshold
+        }
@@ -0,0 +1,56 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Dict
+
+
+class _Call:
+    def __init__(self, task: asyncio.Task):
+        self.task = task
+        self.waiters = 0
+
+
+class SingleFlight:
+    """
+    Coalesce concurrent calls that share a key into one in-flight call.
+
+    The first caller for a key starts the call as a task; callers arriving
+    while it runs await the same task and receive its result or exception.
+    A cancelled caller only stops waiting; the shared call is cancelled once
+    every caller waiting on it has been cancelled.
+    """
+
+    def __init__(self):
+        self.calls = 0
+        self.shared = 0
+        self._inflight: Dict[str, _Call] = {}
+
+    def _forget(self, key: str, call: _Call):
+        if self._inflight.get(key) is call:
+            del self._inflight[key]
+        # Mark the exception as retrieved even if every waiter was cancelled
+        if not call.task.cancelled():
+            call.task.exception()
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """Return fn()'s result, sharing it with concurrent callers using the same key"""
+        call = self._inflight.get(key)
+        if call is None:
+            self.calls += 1
+            call = _Call(asyncio.ensure_future(fn()))
+            self._inflight[key] = call
+            call.task.add_done_callback(lambda _: self._forget(key, call))
+        else:
+            self.shared += 1
+
+        call.waiters += 1
+        try:
+            return await asyncio.shield(call.task)
+        except asyncio.CancelledError:
+            if call.waiters == 1 and not call.task.done():
+                call.task.cancel()
+            raise
+        finally:
+            call.waiters -= 1
+
+    def stats(self) -> Dict[str, int]:
+        """Upstream calls started versus callers that joined one already in flight"""
+        return {"calls": self.calls, "shared": self.shared, "in_flight": len(self._inflight)}
@@ -28,13 +28,90 @@ document.addEventListener('DOMContentLoaded', function() {
         });
     }
     
-    // Regular form submission
+    // Regular form submission: stream the script in as it is generated,
+    // falling back to a normal form post if streaming isn't supported
     if (regularForm) {
-        regularForm.addEventListener('submit', function() {
+        regularForm.addEventListener('submit', function(event) {
             loadingSpinner.classList.remove('hidden');
+            if (window.fetch && window.ReadableStream && window.TextDecoder) {
+                event.preventDefault();
+                streamScript(regularForm);
+            }
         });
     }
     
+    // Post the form as JSON to the SSE endpoint and append tokens as they arrive
+    async function streamScript(form) {
+        const scriptOutput = document.getElementById('script-output');
+        const scriptContent = document.getElementById('script-content');
+        const payload = Object.fromEntries(new FormData(form).entries());
+        payload.duration = parseInt(payload.duration, 10) || 5;
+        const fresh = payload.fresh === 'true';
+        const sectioned = payload.sectioned === 'true';
+        delete payload.fresh;
+        delete payload.sectioned;
+        
+        scriptContent.textContent = '';
+        form.querySelector('button[type="submit"]').disabled = true;
+        try {
+            const response = await fetch(`/api/generate/stream?fresh=${fresh}&sectioned=${sectioned}`, {
+                method: 'POST',
+                headers: { 'Content-Type': 'application/json' },
+                body: JSON.stringify(payload)
+            });
+            if (!response.ok) {
+                throw new Error('Error generating script');
+            }
+            
+            const reader = response.body.getReader();
+            const decoder = new TextDecoder();
+            let buffer = '';
+            while (true) {
+                const { value, done } = await reader.read();
+                if (done) break;
+                buffer += decoder.decode(value, { stream: true });
+                
+                // Events are separated by a blank line
+                const events = buffer.split('\n\n');
+                buffer = events.pop();
+                for (const rawEvent of events) {
+                    let eventType = 'message';
+                    let data = '';
+                    for (const line of rawEvent.split('\n')) {
+                        if (line.startsWith('event:')) eventType = line.slice(6).trim();
+                        else if (line.startsWith('data:')) data += line.slice(5).trim();
+                    }
+                    const parsed = data ? JSON.parse(data) : {};
+                    if (eventType === 'error') {
+                        throw new Error(parsed.detail || 'Error generating script');
+                    }
+                    if (eventType === 'message' && parsed.token) {
+                        // Show the output as soon as the first token arrives
+                        loadingSpinner.classList.add('hidden');
+                        scriptOutput.classList.remove('hidden');
+                        scriptContent.textContent += parsed.token;
+                    }
+                }
+            }
+        } catch (error) {
+            console.error('Error:', error);
+            showError(error.message);
+        } finally {
+            loadingSpinner.classList.add('hidden');
+            form.querySelector('button[type="submit"]').disabled = false;
+        }
+    }
+    
+    function showError(message) {
+        let errorBox = document.querySelector('.container > .error');
+        if (!errorBox) {
+            errorBox = document.createElement('div');
+            errorBox.className = 'error';
+            document.querySelector('.toggle-container').after(errorBox);
+        }
+        errorBox.textContent = message;
+    }
+    
     // Channel lookup function
     if (channelIdInput) {
         channelIdInput.addEventListener('blur', async function() {
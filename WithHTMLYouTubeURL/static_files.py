@@ -0,0 +1,28 @@
+import os
+import hashlib
+from functools import lru_cache
+from starlette.staticfiles import StaticFiles
+
+STATIC_DIR = "static"
+# Cache lifetime of assets requested without a version (static_url adds one)
+STATIC_MAX_AGE = int(os.getenv("STATIC_MAX_AGE", "3600"))
+
+
+@lru_cache(maxsize=None)
+def static_url(path: str) -> str:
+    """URL of a static asset, versioned by a hash of its content so browsers can cache it for good"""
+    with open(os.path.join(STATIC_DIR, path), "rb") as f:
+        version = hashlib.sha256(f.read()).hexdigest()[:12]
+    return f"/static/{path}?v={version}"
+
+
+class CachedStaticFiles(StaticFiles):
+    """StaticFiles with Cache-Control: immutable for versioned URLs, STATIC_MAX_AGE otherwise"""
+
+    def file_response(self, full_path, stat_result, scope, status_code=200):
+        response = super().file_response(full_path, stat_result, scope, status_code)
+        if b"v=" in scope.get("query_string", b""):
+            response.headers["Cache-Control"] = "public, max-age=31536000, immutable"
+        else:
+            response.headers["Cache-Control"] = f"public, max-age={STATIC_MAX_AGE}"
+        return response
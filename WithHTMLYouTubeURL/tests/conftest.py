@@ -0,0 +1,13 @@
+import os
+import sys
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Keep every store in memory, so tests never touch the .db files of a local run
+for name in ("ADMISSION_DB", "CHANNEL_INDEX_DB", "YOUTUBE_QUOTA_DB", "CHANNEL_SYNC_DB", "SCRIPT_CACHE_DB"):
+    os.environ[name] = ""
+os.environ["JOBS_DB"] = ":memory:"
+
+# The app opens static/ and templates/ relative to the working directory
+os.chdir(APP_DIR)
+sys.path.insert(0, APP_DIR)
@@ -0,0 +1,124 @@
+import time
+import json
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+import main
+from admission import admission_client
+
+
+def _stream_scope(client: str):
+    return {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "POST", "scheme": "http",
+        "path": "/api/generate/stream", "raw_path": b"/api/generate/stream", "root_path": "",
+        "query_string": b"fresh=true", "headers": [(b"content-type", b"application/json"), (b"host", b"test")],
+        "client": (client, 50000), "server": ("test", 80)
+    }
+
+
+async def _abort_stream(client: str) -> int:
+    """Start a streamed generation, disconnect after its first token and return the status"""
+    body = json.dumps({"topic": "Aborted stream", "duration": 1, "language": "English"}).encode()
+    first_token = asyncio.Event()
+    sent_request = False
+    status = None
+
+    async def receive():
+        nonlocal sent_request
+        if not sent_request:
+            sent_request = True
+            return {"type": "http.request", "body": body, "more_body": False}
+        await first_token.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        nonlocal status
+        if message["type"] == "http.response.start":
+            status = message["status"]
+        if message["type"] == "http.response.body" and message.get("body"):
+            first_token.set()
+            # Database work queued from now on runs only once the worker thread is free
+            asyncio.get_running_loop().run_in_executor(None, time.sleep, 0.1)
+            # The client has gone: the stream stays parked at its yield until it is cancelled
+            await asyncio.Event().wait()
+
+    await asyncio.wait_for(main.app(_stream_scope(client), receive, send), 10)
+    return status
+
+
+def test_aborted_streams_release_their_groq_slots(monkeypatch):
+    async def endless_stream(prompt, max_tokens=None):
+        while True:
+            yield "word "
+            await asyncio.sleep(0.01)
+
+    monkeypatch.setattr(main, "get_script_stream", endless_stream)
+
+    async def abort_all():
+        asyncio.get_running_loop().set_default_executor(ThreadPoolExecutor(max_workers=1))
+        # More aborted streams than the client's share: a leaked slot would shed the last ones
+        statuses = [await _abort_stream("10.0.0.1") for _ in range(main.admission.per_client + 1)]
+        await asyncio.sleep(0.3)
+        # Checked before the loop closes, since that finalizes abandoned generators
+        return statuses, main.admission.depths()
+
+    statuses, depths = asyncio.run(abort_all())
+    assert statuses == [200] * (main.admission.per_client + 1)
+    assert depths[("groq", "running")] == 0
+    assert depths[("groq", "waiting")] == 0
+
+
+def test_cancelled_release_still_frees_the_slot():
+    async def acquire_then_cancel_release():
+        token = admission_client.set("ip:10.0.0.2")
+        try:
+            slot = await main.admission.acquire("groq")
+        finally:
+            admission_client.reset(token)
+        # Keep the only worker thread busy so the delete is still queued when the
+        # release is cancelled, as when a client disconnect cancels cleanup code
+        loop = asyncio.get_running_loop()
+        loop.set_default_executor(ThreadPoolExecutor(max_workers=1))
+        busy = loop.run_in_executor(None, time.sleep, 0.2)
+        release = asyncio.create_task(main.admission.release("groq", slot))
+        await asyncio.sleep(0.05)
+        release.cancel()
+        await asyncio.gather(release, busy, return_exceptions=True)
+        await asyncio.sleep(0.1)
+        return main.admission.depths()
+
+    depths = asyncio.run(acquire_then_cancel_release())
+    assert depths[("groq", "running")] == 0
+
+
+def test_sectioned_request_fans_out_without_shedding_itself(monkeypatch):
+    outline = json.dumps({
+        "structure": "0:00 Hook", "hook": "Open strong", "engagement": "Ask a question",
+        "chapters": [{"title": f"Part {index}", "summary": "More"} for index in range(1, 4)]
+    })
+    running = []
+
+    async def fake_get_script(prompt, max_tokens=None):
+        running.append(main.admission.depths()[("groq", "running")])
+        await asyncio.sleep(0.05)
+        return outline if "Reply with JSON only" in prompt else "Section text"
+
+    monkeypatch.setattr(main, "get_script", fake_get_script)
+
+    async def generate_while_busy():
+        token = admission_client.set("ip:10.0.0.3")
+        try:
+            # The client's other requests hold all but one of its slots
+            others = [await main.admission.acquire("groq") for _ in range(main.admission.per_client - 1)]
+            data = main.ScriptRequest(topic="Fan-out", duration=5)
+            script, _ = await main.generate_script(data, fresh=True, sectioned=True)
+            for slot in others:
+                await main.admission.release("groq", slot)
+            return script
+        finally:
+            admission_client.reset(token)
+
+    script = asyncio.run(generate_while_busy())
+    assert "Chapter 3: Part 3" in script
+    # The concurrent sections ran in fan-out slots, counted against the groq limit
+    assert max(running) > main.admission.per_client
+    assert main.admission.depths()[("groq", "running")] == 0
@@ -0,0 +1,54 @@
+import asyncio
+import pytest
+from quota import QuotaManager, QuotaExceeded, quota_budget
+
+
+def test_request_budget_errors_have_no_retry_after(tmp_path):
+    quota = QuotaManager(daily_limit=10000, db_path=str(tmp_path / "quota.db"))
+
+    async def spend():
+        with quota_budget(100):
+            await quota.charge("search")
+            await quota.charge("channels")
+
+    with pytest.raises(QuotaExceeded) as error:
+        asyncio.run(spend())
+    assert error.value.status_code == 400
+    assert error.value.headers == {}
+    assert quota.used() == 100
+
+
+def test_daily_quota_errors_retry_after_the_reset(tmp_path):
+    quota = QuotaManager(daily_limit=150, db_path=str(tmp_path / "quota.db"))
+
+    async def spend():
+        await quota.charge("search")
+        await quota.charge("search")
+
+    with pytest.raises(QuotaExceeded) as error:
+        asyncio.run(spend())
+    assert error.value.status_code == 429
+    assert int(error.value.headers["Retry-After"]) > 0
+    assert quota.used() == 100
+
+
+def test_concurrent_charges_stay_within_the_request_budget(tmp_path):
+    quota = QuotaManager(daily_limit=10000, db_path=str(tmp_path / "quota.db"))
+
+    async def spend():
+        with quota_budget(5):
+            results = await asyncio.gather(*(quota.charge("videos") for _ in range(8)), return_exceptions=True)
+        return [result for result in results if isinstance(result, QuotaExceeded)]
+
+    assert len(asyncio.run(spend())) == 3
+    assert quota.used() == 5
+
+
+def test_uncached_error_blames_the_budget_that_ran_out():
+    quota = QuotaManager(daily_limit=10000)
+    with quota_budget(1):
+        assert quota.uncached_error().status_code == 400
+    quota_low = QuotaManager(daily_limit=100)
+    asyncio.run(quota_low.charge("search"))
+    with quota_budget(1):
+        assert quota_low.uncached_error().status_code == 429
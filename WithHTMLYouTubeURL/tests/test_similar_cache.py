@@ -0,0 +1,22 @@
+from similar_cache import SimilarIndex
+
+
+def test_added_qualifier_words_still_hit():
+    index = SimilarIndex()
+    index.add("tips", "bucket", "10 python tips")
+    assert [key for _, key in index.find("bucket", "Ten Python tips for beginners")] == ["tips"]
+
+
+def test_model_variants_numbers_and_negations_miss():
+    index = SimilarIndex()
+    index.add("iphone", "bucket", "iPhone 15 review")
+    index.add("rust", "bucket", "Why you should learn Rust in 2024")
+    assert index.find("bucket", "iPhone 15 Pro review") == []
+    assert index.find("bucket", "iPhone 14 review") == []
+    assert index.find("bucket", "Why you shouldn't learn Rust in 2024") == []
+
+
+def test_other_buckets_never_match():
+    index = SimilarIndex()
+    index.add("tips", "english", "10 python tips")
+    assert index.find("spanish", "10 python tips") == []
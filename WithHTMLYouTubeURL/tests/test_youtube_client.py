@@ -0,0 +1,39 @@
+import asyncio
+import httpx
+from cache import TTLCache
+from youtube_client import YouTubeClient
+
+
+def _client(calls):
+    def handler(request: httpx.Request) -> httpx.Response:
+        resource = request.url.path.rsplit("/", 1)[-1]
+        calls.append(resource)
+        if resource == "channels":
+            if request.url.params.get("forHandle") == "@exact":
+                return httpx.Response(200, json={"items": [{"id": "UCexact0000000000000000"}]})
+            return httpx.Response(200, json={"items": []})
+        return httpx.Response(200, json={"items": [{"snippet": {"channelId": "UCguess0000000000000000"}}]})
+
+    http = httpx.AsyncClient(base_url="https://youtube.test/youtube/v3", transport=httpx.MockTransport(handler))
+    index = TTLCache(max_entries=100, ttl=3600)
+    return YouTubeClient(api_key="key", client=http, index=index), index
+
+
+def test_exact_handles_are_indexed():
+    calls = []
+    client, index = _client(calls)
+    assert asyncio.run(client.extract_channel_id("@exact")) == "UCexact0000000000000000"
+    assert index.get("handle:exact") == "UCexact0000000000000000"
+    assert calls == ["channels"]
+
+
+def test_search_guesses_are_reused_but_not_indexed():
+    calls = []
+    client, index = _client(calls)
+
+    async def resolve_twice():
+        return [await client.extract_channel_id("@someone") for _ in range(2)]
+
+    assert asyncio.run(resolve_twice()) == ["UCguess0000000000000000"] * 2
+    assert index.get("handle:someone") is None
+    assert calls == ["channels", "search"]
@@ -1,5 +1,85 @@
 import re
-from typing import Dict, Any, List, Optional
+import time
+from collections import Counter
+from datetime import datetime
+from typing import TYPE_CHECKING, Dict, Any, AsyncIterator, List, Optional, Tuple
+from models import ToneAnalysisResult
+
+if TYPE_CHECKING:
+    import numpy as np
+
+
+def _compile_keywords(tone_keywords: Dict[str, List[str]]) -> Tuple["re.Pattern", Dict[str, Counter]]:
+    """
+    Compile every tone keyword into one regex that finds all of them in a single scan.
+
+    The alternation sits inside a lookahead so matches may overlap (e.g. "life"
+    inside "day in the life"), and is ordered longest-first. A keyword that is a
+    word-boundary prefix of a longer one (e.g. "personal" in "personal development")
+    can't win at the same position, so the longer keyword also credits it.
+    Returns the pattern and, per keyword, how many times it counts towards each tone.
+    """
+    tone_weights: Dict[str, Counter] = {}
+    for tone, keywords in tone_keywords.items():
+        for keyword in keywords:
+            tone_weights.setdefault(keyword, Counter())[tone] += 1
+
+    keywords = sorted(tone_weights, key=len, reverse=True)
+    credits = {}
+    for keyword in keywords:
+        credited = Counter(tone_weights[keyword])
+        for other in keywords:
+            if len(other) < len(keyword) and re.match(rf'{re.escape(other)}\b', keyword):
+                credited.update(tone_weights[other])
+        credits[keyword] = credited
+
+    alternation = '|'.join(re.escape(keyword) for keyword in keywords)
+    return re.compile(rf'(?=\b({alternation})\b)'), credits
+
+
+class ToneMatrix:
+    """
+    Videos x tone-keywords count matrix, grown a page of videos at a time.
+
+    Only keyword counts and engagement numbers are kept per video (a few hundred
+    bytes), never the text, so memory grows linearly and stays small even for
+    channels with thousands of uploads.
+    """
+
+    def __init__(self, keyword_count: int, capacity: int = 256):
+        import numpy as np
+        self.rows = 0
+        self.counts = np.zeros((capacity, keyword_count), dtype=np.uint16)
+        self.views = np.zeros(capacity)
+        self.likes = np.zeros(capacity)
+        # Upload time as a Unix timestamp, NaN if unknown
+        self.published = np.full(capacity, np.nan)
+
+    def _grow(self):
+        import numpy as np
+        capacity = len(self.views) * 2
+        self.counts = np.resize(self.counts, (capacity, self.counts.shape[1]))
+        self.views = np.resize(self.views, capacity)
+        self.likes = np.resize(self.likes, capacity)
+        self.published = np.resize(self.published, capacity)
+
+    def append(self, counts: "np.ndarray", views: float, likes: float, published: float):
+        if self.rows == len(self.views):
+            self._grow()
+        self.counts[self.rows] = counts
+        self.views[self.rows] = views
+        self.likes[self.rows] = likes
+        self.published[self.rows] = published
+        self.rows += 1
+
+
+def _timestamp(published_at: str) -> float:
+    """Unix time of an ISO 8601 publishedAt value, or NaN"""
+    try:
+        return datetime.fromisoformat(published_at.replace('Z', '+00:00')).timestamp()
+    except (AttributeError, ValueError):
+        return float('nan')
+
 
 class ToneAnalyzer:
     # Tone categories with associated keywords
@@ -51,14 +131,16 @@ class ToneAnalyzer:
         ]
     }
     
-    def analyze_channel_tone(self, channel_data: Dict[str, Any]) -> str:
-        """
-        Analyze channel content to determine predominant tone.
-        Returns the tone name as a string.
-        """
-        if not channel_data:
-            return "Informative"  # Default fallback
-            
+    def __init__(self):
+        self._pattern, self._credits = _compile_keywords(self.TONE_KEYWORDS)
+        self._tones = list(self.TONE_KEYWORDS)
+        # Column per keyword in a ToneMatrix row, and the (keywords x tones) credit
+        # matrix, built by the first analyze_history call
+        self._columns = {keyword: column for column, keyword in enumerate(self._credits)}
+        self._tone_matrix = None
+
+    def _combined_text(self, channel_data: Dict[str, Any]) -> str:
+        """Lower-cased channel title, description, keywords and video titles/descriptions"""
         # Collect text from various sources to analyze
         text_sources = [
             channel_data.get('title', ''),
@@ -71,58 +153,103 @@ class ToneAnalyzer:
             text_sources.append(video.get('title', ''))
             text_sources.append(video.get('description', ''))
             
-        combined_text = ' '.join(text_sources).lower()
-        
-        # Count occurrences of tone keywords
-        tone_scores = {}
-        for tone, keywords in self.TONE_KEYWORDS.items():
-            score = 0
-            for keyword in keywords:
-                # Count occurrences of each keyword
-                score += len(re.findall(rf'\b{re.escape(keyword)}\b', combined_text))
-            tone_scores[tone] = score
+        return ' '.join(text_sources).lower()
+
+    def score_text(self, text: str) -> Dict[str, int]:
+        """Count tone keyword occurrences in lower-cased text with one regex scan"""
+        tone_scores = Counter({tone: 0 for tone in self.TONE_KEYWORDS})
+        for match in self._pattern.finditer(text):
+            tone_scores.update(self._credits[match.group(1)])
+        return dict(tone_scores)
+
+    def analyze(self, channel_data: Dict[str, Any], count: int = 2) -> ToneAnalysisResult:
+        """
+        Score every tone in one pass over the channel text.
+        Returns the primary tone, `count` secondary tones and the ranked score vector.
+        """
+        if not channel_data:
+            return ToneAnalysisResult(primary_tone="Informative", secondary_tones=["Conversational"])
+
+        return self.rank(self.score_text(self._combined_text(channel_data)), count)
+
+    @staticmethod
+    def rank(tone_scores: Dict[str, float], count: int) -> ToneAnalysisResult:
+        """Pick the primary and `count` secondary tones from a tone -> score mapping"""
+        # Sort tones by score in descending order (ties keep TONE_KEYWORDS order)
+        ranked = sorted(tone_scores.items(), key=lambda x: x[1], reverse=True)
         
-        # Determine predominant tone based on keyword frequency
-        if not tone_scores or max(tone_scores.values(), default=0) == 0:
-            return "Informative"  # Default if no matches
-            
-        # Get tone with highest score
-        predominant_tone = max(tone_scores.items(), key=lambda x: x[1])[0]
-        return predominant_tone
+        # Default to Informative if nothing matched
+        primary_tone = ranked[0][0] if ranked and ranked[0][1] > 0 else "Informative"
+        return ToneAnalysisResult(
+            primary_tone=primary_tone,
+            secondary_tones=[tone for tone, _ in ranked[1:count+1]],
+            scores=dict(ranked)
+        )
+
+    def keyword_counts(self, text: str) -> "np.ndarray":
+        """Occurrences of each tone keyword in lower-cased text, as a ToneMatrix row"""
+        import numpy as np
+        row = np.zeros(len(self._columns), dtype=np.uint16)
+        for keyword, occurrences in Counter(match.group(1) for match in self._pattern.finditer(text)).items():
+            row[self._columns[keyword]] = min(occurrences, np.iinfo(np.uint16).max)
+        return row
+
+    async def analyze_history(self, channel_data: Dict[str, Any], pages: AsyncIterator[List[Dict[str, Any]]],
+                              weight_by_engagement: bool = True, recency_half_life_days: Optional[float] = None,
+                              count: int = 2) -> Tuple[ToneAnalysisResult, int]:
+        """
+        Score tones over a channel's whole upload history, read page by page from `pages`
+        (lists of video dicts as returned by get_channel_info).
+
+        Each video is reduced to a row of keyword counts as it arrives; the scores
+        are then one weighted sum over the matrix. Videos can be weighted by
+        engagement (log views + log likes) and by recency (halving every
+        recency_half_life_days). Weights are normalized to average 1, and the
+        channel's own title, description and keywords count as one more video.
+        Returns the result and the number of videos analyzed.
+        """
+        # numpy is only needed here, so it's imported on first use to keep startup fast
+        import numpy as np
+        if self._tone_matrix is None:
+            self._tone_matrix = np.array([[self._credits[keyword][tone] for tone in self._tones]
+                                          for keyword in self._credits], dtype=np.float64)
+
+        matrix = ToneMatrix(len(self._columns))
+        async for videos in pages:
+            for video in videos:
+                text = f"{video.get('title', '')} {video.get('description', '')}".lower()
+                matrix.append(self.keyword_counts(text), float(video.get('views') or 0),
+                              float(video.get('likes') or 0), _timestamp(video.get('publishedAt', '')))
+
+        channel_text = ' '.join([channel_data.get('title', ''), channel_data.get('description', ''),
+                                 channel_data.get('keywords', '')]).lower()
+        keyword_totals = self.keyword_counts(channel_text).astype(np.float64)
+
+        if matrix.rows:
+            weights = np.ones(matrix.rows)
+            if weight_by_engagement:
+                weights += np.log1p(matrix.views[:matrix.rows]) + np.log1p(matrix.likes[:matrix.rows])
+            if recency_half_life_days:
+                age_days = (time.time() - matrix.published[:matrix.rows]) / 86400
+                weights *= np.where(np.isnan(age_days), 1.0, 0.5 ** (np.maximum(age_days, 0) / recency_half_life_days))
+            if weights.sum() > 0:
+                weights *= matrix.rows / weights.sum()
+            keyword_totals += weights @ matrix.counts[:matrix.rows]
+
+        tone_totals = keyword_totals @ self._tone_matrix
+        tone_scores = {tone: round(float(score), 2) for tone, score in zip(self._tones, tone_totals)}
+        return self.rank(tone_scores, count), matrix.rows
+    
+    def analyze_channel_tone(self, channel_data: Dict[str, Any]) -> str:
+        """
+        Analyze channel content to determine predominant tone.
+        Returns the tone name as a string.
+        """
+        return self.analyze(channel_data).primary_tone
     
     def get_secondary_tones(self, channel_data: Dict[str, Any], count: int = 2) -> List[str]:
         """
         Get secondary tones that complement the primary tone.
         Returns a list of tone names.
         """
-        if not channel_data:
-            return ["Conversational"]  # Default fallback
-        
-        # Collect text from various sources to analyze
-        text_sources = [
-            channel_data.get('title', ''),
-            channel_data.get('description', ''),
-            channel_data.get('keywords', '')
-        ]
-        
-        # Add video titles and descriptions
-        for video in channel_data.get('videos', []):
-            text_sources.append(video.get('title', ''))
-            text_sources.append(video.get('description', ''))
-            
-        combined_text = ' '.join(text_sources).lower()
-        
-        # Count occurrences of tone keywords
-        tone_scores = {}
-        for tone, keywords in self.TONE_KEYWORDS.items():
-            score = 0
-            for keyword in keywords:
-                # Count occurrences of each keyword
-                score += len(re.findall(rf'\b{re.escape(keyword)}\b', combined_text))
-            tone_scores[tone] = score
-        
-        # Sort tones by score in descending order
-        sorted_tones = sorted(tone_scores.items(), key=lambda x: x[1], reverse=True)
-        
-        # Get top N tones excluding the main one
-        return [tone for tone, _ in sorted_tones[1:count+1]]
\ No newline at end of file
+        return self.analyze(channel_data, count).secondary_tones
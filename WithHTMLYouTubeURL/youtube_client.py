@@ -1,134 +1,493 @@
 import os
-import json
-from typing import Dict, Any, Optional
-from googleapiclient.discovery import build
-from googleapiclient.errors import HttpError
+import asyncio
+from typing import Dict, Any, AsyncIterator, List, Optional, Set, Tuple
+import httpx
 from dotenv import load_dotenv
+from cache import TTLCache
+from quota import QuotaManager, QuotaExceeded, QUOTA_COSTS, MAX_RESULTS_PER_PAGE
+from metrics import timed, UPSTREAM_CALLS, UPSTREAM_ERRORS, YOUTUBE_QUOTA_UNITS
 
 load_dotenv()
 YOUTUBE_API_KEY = os.getenv("YOUTUBE_API_KEY")
+YOUTUBE_API_URL = os.getenv("YOUTUBE_API_URL", "https://www.googleapis.com/youtube/v3")
+# Number of recent uploads to pull for tone analysis
+RECENT_VIDEO_COUNT = int(os.getenv("YOUTUBE_RECENT_VIDEOS", "10"))
+# Cap on uploads read by iter_upload_pages (full-history tone analysis)
+YOUTUBE_HISTORY_MAX_VIDEOS = int(os.getenv("YOUTUBE_HISTORY_MAX_VIDEOS", "5000"))
+# Channels whose uploads are listed at the same time by get_channels_info
+YOUTUBE_BULK_CONCURRENCY = int(os.getenv("YOUTUBE_BULK_CONCURRENCY", "8"))
+# Connection pool shared by every lookup made through one client
+YOUTUBE_MAX_CONNECTIONS = int(os.getenv("YOUTUBE_MAX_CONNECTIONS", "20"))
+YOUTUBE_TIMEOUT = float(os.getenv("YOUTUBE_TIMEOUT", "10"))
+# How long a channel guessed by search() is reused; guesses are never written to the index
+YOUTUBE_SEARCH_GUESS_TTL = float(os.getenv("YOUTUBE_SEARCH_GUESS_TTL", "3600"))
+
+
+class YouTubeAPIError(Exception):
+    """Raised when the YouTube Data API answers with a non-2xx status"""
+
+    def __init__(self, status_code: int, message: str):
+        super().__init__(f"{status_code}: {message}")
+        self.status_code = status_code
+        self.message = message
+
 
 class YouTubeClient:
-    def __init__(self):
-        self._service = build('youtube', 'v3', developerKey=YOUTUBE_API_KEY)
-    
-    def extract_channel_id(self, input_text: str) -> str:
+    def __init__(self, api_key: Optional[str] = YOUTUBE_API_KEY, base_url: str = YOUTUBE_API_URL,
+                 client: Optional[httpx.AsyncClient] = None, index: Optional[TTLCache] = None,
+                 quota: Optional[QuotaManager] = None):
+        """
+        `index` maps handles and custom URLs to channel IDs (see extract_channel_id).
+        `quota`, if given, is charged before every call and raises QuotaExceeded
+        instead of letting a call exceed the daily or per-request budget.
+        """
+        self._api_key = api_key
+        self._base_url = base_url
+        self._index = index
+        self._quota = quota
+        self._http = client
+        # Aliases resolved by search(), which may be the wrong channel: kept briefly, in memory
+        self._guesses = TTLCache(max_entries=1000, ttl=YOUTUBE_SEARCH_GUESS_TTL)
+
+    @property
+    def _client(self) -> httpx.AsyncClient:
+        """
+        The pooled HTTP client, created on first use: building it loads the CA
+        bundle and SSL context, which would otherwise slow down every worker start.
+        """
+        if self._http is None:
+            self._http = httpx.AsyncClient(
+                base_url=self._base_url,
+                timeout=httpx.Timeout(YOUTUBE_TIMEOUT),
+                limits=httpx.Limits(
+                    max_connections=YOUTUBE_MAX_CONNECTIONS,
+                    max_keepalive_connections=YOUTUBE_MAX_CONNECTIONS
+                )
+            )
+        return self._http
+
+    async def aclose(self):
+        """Close the pooled HTTP connections, if any were opened"""
+        if self._http is not None:
+            await self._http.aclose()
+            self._http = None
+
+    async def _get(self, resource: str, etag: Optional[str] = None, **params) -> Optional[Dict[str, Any]]:
+        """
+        Call a Data API list endpoint and return the decoded JSON body. With `etag`
+        the call is conditional and returns None if the response is unchanged (304).
+        """
+        params = {key: value for key, value in params.items() if value is not None}
+        params['key'] = self._api_key
+        headers = {'If-None-Match': etag} if etag else None
+        if self._quota is not None:
+            await self._quota.charge(resource)
+        UPSTREAM_CALLS.inc('youtube', resource)
+        YOUTUBE_QUOTA_UNITS.inc(resource, amount=QUOTA_COSTS.get(resource, 1))
+        try:
+            with timed(f"youtube_{resource}"):
+                response = await self._client.get(f"/{resource}", params=params, headers=headers)
+        except httpx.HTTPError:
+            UPSTREAM_ERRORS.inc('youtube', resource)
+            raise
+        if response.status_code == 304:
+            return None
+        if response.status_code >= 400:
+            UPSTREAM_ERRORS.inc('youtube', resource)
+            try:
+                message = response.json().get('error', {}).get('message', response.text)
+            except ValueError:
+                message = response.text
+            raise YouTubeAPIError(response.status_code, message)
+        return response.json()
+
+    async def extract_channel_id(self, input_text: str, online: bool = True) -> str:
         """
         Extract the channel ID from various YouTube channel URL formats or return the ID directly.
-        
+
         Handles formats like:
         - https://www.youtube.com/channel/UC1234567890
         - https://www.youtube.com/c/ChannelName
+        - https://www.youtube.com/user/username
         - https://www.youtube.com/@username
         - UC1234567890 (direct ID)
+
+        Handles and custom URLs resolved exactly are remembered in the channel index,
+        so repeat lookups need no network call; channels guessed by search are only
+        reused for YOUTUBE_SEARCH_GUESS_TTL. With online=False only the index is used.
         """
         input_text = input_text.strip()
-        
+
         # If it's already a channel ID (starts with UC)
         if input_text.startswith('UC') and len(input_text) > 10:
             return input_text
-            
+
         # Extract from /channel/ URL
         if '/channel/' in input_text:
             parts = input_text.split('/channel/')
             if len(parts) > 1:
                 return parts[1].split('/')[0].split('?')[0]
-        
-        # Handle /c/ or /user/ or @username formats by retrieving channel info
-        try:
-            if '/c/' in input_text or '/user/' in input_text or '@' in input_text:
-                # Extract the username part
-                username = None
-                if '/c/' in input_text:
-                    username = input_text.split('/c/')[1].split('/')[0].split('?')[0]
-                elif '/user/' in input_text:
-                    username = input_text.split('/user/')[1].split('/')[0].split('?')[0]
-                elif '@' in input_text:
-                    if '/@' in input_text:
-                        username = input_text.split('/@')[1].split('/')[0].split('?')[0]
-                    else:
-                        username = input_text.replace('@', '')
-                
-                if username:
-                    # Search for the channel
-                    search_response = self._service.search().list(
-                        q=username,
-                        type='channel',
-                        part='snippet',
-                        maxResults=1
-                    ).execute()
-                    
-                    if search_response.get('items'):
-                        return search_response['items'][0]['snippet']['channelId']
-        except HttpError:
-            # Fall back to using the input as is if we can't resolve it
-            pass
-            
+
+        # Handle /c/ or /user/ or @username formats: check the local index first,
+        # then the direct channels().list lookup, and search only as a fallback
+        alias = self._parse_alias(input_text)
+        if alias:
+            kind, username = alias
+            index_key = self._index_key(kind, username)
+            channel_id = self._index.get(index_key) if self._index is not None else None
+            channel_id = channel_id or self._guesses.get(index_key)
+            if channel_id:
+                return channel_id
+            if not online:
+                return input_text
+            try:
+                channel_id, exact = await self._lookup_alias(kind, username)
+                if channel_id:
+                    if not exact:
+                        self._guesses.set(index_key, channel_id)
+                    elif self._index is not None:
+                        self._index.set(index_key, channel_id)
+                    return channel_id
+            except (YouTubeAPIError, httpx.HTTPError):
+                # Fall back to using the input as is if we can't resolve it
+                pass
+
         # Return original if we couldn't extract anything
         return input_text
-    
-    def get_channel_info(self, channel_id: str) -> Optional[Dict[str, Any]]:
-        """Get channel details including title, description, stats"""
+
+    @staticmethod
+    def _parse_alias(input_text: str) -> Optional[Tuple[str, str]]:
+        """Split a /c/, /user/ or @handle input into (kind, name), or None"""
+        if '/c/' in input_text:
+            return 'c', input_text.split('/c/')[1].split('/')[0].split('?')[0] or None
+        if '/user/' in input_text:
+            return 'user', input_text.split('/user/')[1].split('/')[0].split('?')[0] or None
+        if '@' in input_text:
+            if '/@' in input_text:
+                username = input_text.split('/@')[1].split('/')[0].split('?')[0]
+            else:
+                username = input_text.replace('@', '')
+            return ('handle', username) if username else None
+        return None
+
+    @staticmethod
+    def _index_key(kind: str, name: str) -> str:
+        """Channel index key: handles and custom URLs are case-insensitive"""
+        return f"{kind}:{name.lower()}"
+
+    async def _lookup_alias(self, kind: str, username: str) -> Tuple[Optional[str], bool]:
+        """
+        Resolve a handle, legacy username or custom URL to (channel ID, whether the
+        match is exact), or (None, False).
+
+        channels().list(forHandle/forUsername) costs 1 quota unit and is exact;
+        custom /c/ URLs have no direct lookup, but usually match the handle.
+        search().list (100 units, may pick the wrong channel) is the last resort.
+        """
+        if kind == 'user':
+            lookup = {'forUsername': username}
+        else:
+            lookup = {'forHandle': f"@{username}"}
+        channel_response = await self._get('channels', part='id', **lookup)
+        if channel_response.get('items'):
+            return channel_response['items'][0]['id'], True
+
+        search_response = await self._get(
+            'search',
+            q=username,
+            type='channel',
+            part='snippet',
+            maxResults=1
+        )
+        if search_response.get('items'):
+            return search_response['items'][0]['snippet']['channelId'], False
+        return None, False
+
+    def _remember_custom_url(self, channel_id: str, custom_url: str):
+        """Index a channel's customUrl (an @handle, or a legacy /c/ name)"""
+        if self._index is None or not custom_url:
+            return
+        if custom_url.startswith('@'):
+            key = self._index_key('handle', custom_url[1:])
+        else:
+            key = self._index_key('c', custom_url)
+        self._index.set(key, channel_id)
+
+    async def get_channel_info(self, channel_id: str, max_videos: int = RECENT_VIDEO_COUNT) -> Optional[Dict[str, Any]]:
+        """Get channel details including title, description, stats and recent uploads"""
         try:
-            channel_id = self.extract_channel_id(channel_id)
-            
-            # Get basic channel info
-            channel_response = self._service.channels().list(
-                part='snippet,statistics,brandingSettings',
-                id=channel_id
-            ).execute()
-            
+            channel_id = await self.extract_channel_id(channel_id)
+
+            # A UC... channel's uploads playlist is UU..., so the stats call and the
+            # uploads listing can run concurrently
+            if channel_id.startswith('UC'):
+                channel_response, video_ids = await asyncio.gather(
+                    self._get_channel(channel_id),
+                    self._get_recent_video_ids('UU' + channel_id[2:], max_videos, missing_ok=True)
+                )
+            else:
+                channel_response = await self._get_channel(channel_id)
+                video_ids = None
+
             if not channel_response.get('items'):
                 return None
-                
+
             channel_data = channel_response['items'][0]
-            
-            # Get recent videos to analyze content
-            videos_response = self._service.search().list(
-                channelId=channel_id,
-                part='snippet',
-                order='date',
-                type='video',
-                maxResults=10
-            ).execute()
-            
-            videos = []
-            for item in videos_response.get('items', []):
-                video_id = item['id']['videoId']
-                
-                # Get video details including title, description
-                video_response = self._service.videos().list(
-                    part='snippet,statistics',
-                    id=video_id
-                ).execute()
-                
-                if video_response.get('items'):
-                    video_data = video_response['items'][0]
-                    videos.append({
-                        'id': video_id,
-                        'title': video_data['snippet']['title'],
-                        'description': video_data['snippet']['description'],
-                        'views': video_data['statistics'].get('viewCount', 0),
-                        'likes': video_data['statistics'].get('likeCount', 0),
-                        'comments': video_data['statistics'].get('commentCount', 0)
-                    })
-            
-            # Compile full channel data
-            return {
-                'id': channel_id,
-                'title': channel_data['snippet']['title'],
-                'description': channel_data['snippet']['description'],
-                'customUrl': channel_data['snippet'].get('customUrl', ''),
-                'publishedAt': channel_data['snippet']['publishedAt'],
-                'viewCount': channel_data['statistics'].get('viewCount', 0),
-                'subscriberCount': channel_data['statistics'].get('subscriberCount', 0),
-                'videoCount': channel_data['statistics'].get('videoCount', 0),
-                'keywords': channel_data.get('brandingSettings', {}).get('channel', {}).get('keywords', ''),
-                'videos': videos
-            }
-        except HttpError as e:
+            self._remember_custom_url(channel_id, channel_data['snippet'].get('customUrl', ''))
+
+            # Otherwise read the uploads playlist from contentDetails
+            if video_ids is None:
+                uploads_playlist = channel_data.get('contentDetails', {}).get('relatedPlaylists', {}).get('uploads')
+                video_ids = (await self._get_recent_video_ids(uploads_playlist, max_videos, missing_ok=True)
+                             if uploads_playlist else [])
+
+            videos = await self._get_video_details(video_ids)
+            return self.channel_record(channel_id, channel_data, videos)
+        except QuotaExceeded:
+            raise
+        except YouTubeAPIError as e:
             print(f"YouTube API error: {str(e)}")
             return None
         except Exception as e:
             print(f"Error getting channel info: {str(e)}")
-            return None
\ No newline at end of file
+            return None
+
+    async def get_channels_info(self, channel_ids: List[str], max_videos: int = RECENT_VIDEO_COUNT,
+                                concurrency: int = YOUTUBE_BULK_CONCURRENCY
+                                ) -> AsyncIterator[Tuple[str, Optional[Dict[str, Any]], Optional[str]]]:
+        """
+        Get channel details and recent uploads for many UC... channel IDs.
+
+        Channels are handled 50 at a time: one channels().list call per group, the
+        uploads playlists listed with at most `concurrency` calls in flight, and the
+        group's videos fetched together in videos().list calls of 50 IDs. That is
+        about 1 + 50 + 10 calls per 50 channels instead of 3 per channel.
+
+        Yields (channel_id, channel_data, error) per channel as each group completes;
+        channel_data is None for unknown channels or on error. QuotaExceeded is
+        reported as an error for the affected channels rather than raised.
+        """
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def list_uploads(channel_id: str) -> List[str]:
+            async with semaphore:
+                return await self._get_recent_video_ids('UU' + channel_id[2:], max_videos, missing_ok=True)
+
+        for start in range(0, len(channel_ids), MAX_RESULTS_PER_PAGE):
+            group = channel_ids[start:start + MAX_RESULTS_PER_PAGE]
+            try:
+                channel_response = await self._get_channel(','.join(group))
+            except (QuotaExceeded, YouTubeAPIError, httpx.HTTPError) as e:
+                for channel_id in group:
+                    yield channel_id, None, str(e)
+                continue
+
+            found = {item['id']: item for item in channel_response.get('items', [])}
+            listed = await asyncio.gather(*(list_uploads(channel_id) for channel_id in found),
+                                          return_exceptions=True)
+            uploads = dict(zip(found, listed))
+
+            try:
+                videos = await self._get_video_details([video_id for video_ids in uploads.values()
+                                                        if isinstance(video_ids, list) for video_id in video_ids])
+            except (QuotaExceeded, YouTubeAPIError, httpx.HTTPError) as e:
+                for channel_id in group:
+                    yield channel_id, None, str(e)
+                continue
+            videos_by_id = {video['id']: video for video in videos}
+
+            for channel_id in group:
+                channel_data = found.get(channel_id)
+                if channel_data is None:
+                    yield channel_id, None, None
+                elif isinstance(uploads[channel_id], Exception):
+                    yield channel_id, None, str(uploads[channel_id])
+                else:
+                    self._remember_custom_url(channel_id, channel_data['snippet'].get('customUrl', ''))
+                    channel_videos = [videos_by_id[video_id] for video_id in uploads[channel_id]
+                                      if video_id in videos_by_id]
+                    yield channel_id, self.channel_record(channel_id, channel_data, channel_videos), None
+
+    async def get_channel_changes(self, channel_id: str, max_videos: int = RECENT_VIDEO_COUNT,
+                                  channel_etag: Optional[str] = None, uploads_etag: Optional[str] = None,
+                                  known_video_ids: Optional[Set[str]] = None,
+                                  fetch_channel: bool = True) -> Optional[Dict[str, Any]]:
+        """
+        What changed on a UC... channel since an earlier sync, using conditional requests.
+
+        The channel (skipped unless fetch_channel) and the first uploads page are
+        requested with the ETags from the last sync; unchanged responses come back
+        as 304s with no body. Only uploads newer than the first known video ID are
+        listed and have their details fetched.
+
+        Returns None if the channel doesn't exist, otherwise a dict with
+        - channel: the channels().list item, or None if not fetched or unchanged
+        - channel_etag, uploads_etag: ETags to send next time
+        - new_videos: details of uploads newer than known_video_ids, newest first,
+          or None if the uploads playlist is unchanged
+        """
+        known_video_ids = known_video_ids or set()
+        playlist_id = 'UU' + channel_id[2:]
+
+        async def channel() -> Optional[Dict[str, Any]]:
+            if not fetch_channel:
+                return None
+            return await self._get('channels', etag=channel_etag,
+                                   part='snippet,statistics,brandingSettings,contentDetails', id=channel_id)
+
+        async def first_uploads_page() -> Optional[Dict[str, Any]]:
+            try:
+                return await self._get('playlistItems', etag=uploads_etag, playlistId=playlist_id,
+                                       part='contentDetails', maxResults=min(MAX_RESULTS_PER_PAGE, max_videos))
+            except YouTubeAPIError as e:
+                if e.status_code == 404:
+                    return {'items': []}
+                raise
+
+        channel_response, page = await asyncio.gather(channel(), first_uploads_page())
+        if channel_response is not None and not channel_response.get('items'):
+            return None
+
+        if channel_response is not None:
+            self._remember_custom_url(channel_id, channel_response['items'][0]['snippet'].get('customUrl', ''))
+        changes = {
+            'channel': channel_response['items'][0] if channel_response else None,
+            'channel_etag': channel_response.get('etag', channel_etag) if channel_response else channel_etag,
+            'uploads_etag': page.get('etag', uploads_etag) if page else uploads_etag,
+            'new_videos': None
+        }
+        if page is None:
+            return changes
+
+        # Newest first: stop at the first video seen in an earlier sync
+        new_ids = []
+        while True:
+            for item in page.get('items', []):
+                video_id = item['contentDetails']['videoId']
+                if video_id in known_video_ids or len(new_ids) >= max_videos:
+                    break
+                new_ids.append(video_id)
+            else:
+                if page.get('nextPageToken') and len(new_ids) < max_videos:
+                    page = await self._get('playlistItems', playlistId=playlist_id, part='contentDetails',
+                                           maxResults=min(MAX_RESULTS_PER_PAGE, max_videos - len(new_ids)),
+                                           pageToken=page['nextPageToken'])
+                    continue
+            break
+
+        changes['new_videos'] = await self._get_video_details(new_ids)
+        return changes
+
+    @staticmethod
+    def channel_record(channel_id: str, channel_data: Dict[str, Any], videos: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """Compile full channel data from a channels().list item and its videos"""
+        return {
+            'id': channel_id,
+            'title': channel_data['snippet']['title'],
+            'description': channel_data['snippet']['description'],
+            'customUrl': channel_data['snippet'].get('customUrl', ''),
+            'publishedAt': channel_data['snippet']['publishedAt'],
+            'viewCount': channel_data['statistics'].get('viewCount', 0),
+            'subscriberCount': channel_data['statistics'].get('subscriberCount', 0),
+            'videoCount': channel_data['statistics'].get('videoCount', 0),
+            'keywords': channel_data.get('brandingSettings', {}).get('channel', {}).get('keywords', ''),
+            'videos': videos
+        }
+
+    async def _get_channel(self, channel_id: str) -> Dict[str, Any]:
+        """Get basic channel info (contentDetails carries the uploads playlist); up to 50 comma-separated IDs"""
+        return await self._get(
+            'channels',
+            part='snippet,statistics,brandingSettings,contentDetails',
+            id=channel_id
+        )
+
+    async def _get_recent_video_ids(self, playlist_id: str, max_videos: int, missing_ok: bool = False) -> List[str]:
+        """
+        List the newest video IDs from a channel's uploads playlist.
+
+        playlistItems().list costs 1 quota unit per page, versus 100 for search().list.
+        With missing_ok, a 404 (channel without uploads) yields an empty list.
+        """
+        video_ids = []
+        page_token = None
+        while len(video_ids) < max_videos:
+            try:
+                playlist_response = await self._get(
+                    'playlistItems',
+                    playlistId=playlist_id,
+                    part='contentDetails',
+                    maxResults=min(MAX_RESULTS_PER_PAGE, max_videos - len(video_ids)),
+                    pageToken=page_token
+                )
+            except YouTubeAPIError as e:
+                if missing_ok and e.status_code == 404:
+                    break
+                raise
+
+            for item in playlist_response.get('items', []):
+                video_ids.append(item['contentDetails']['videoId'])
+
+            page_token = playlist_response.get('nextPageToken')
+            if not page_token:
+                break
+        return video_ids[:max_videos]
+
+    async def iter_upload_pages(self, channel_id: str, max_videos: int = YOUTUBE_HISTORY_MAX_VIDEOS
+                                ) -> AsyncIterator[List[Dict[str, Any]]]:
+        """
+        Page through a UC... channel's uploads, newest first, yielding up to 50 video
+        dicts (as in get_channel_info) at a time. The next playlist page is fetched
+        while the current page's video details load, and only one page is held at once.
+        """
+        playlist_id = 'UU' + channel_id[2:]
+
+        async def playlist_page(page_token: Optional[str], wanted: int) -> Dict[str, Any]:
+            return await self._get('playlistItems', playlistId=playlist_id, part='contentDetails',
+                                   maxResults=min(MAX_RESULTS_PER_PAGE, wanted), pageToken=page_token)
+
+        async def no_page() -> Optional[Dict[str, Any]]:
+            return None
+
+        try:
+            page = await playlist_page(None, max_videos)
+        except YouTubeAPIError as e:
+            if e.status_code == 404:
+                return
+            raise
+
+        seen = 0
+        while page is not None:
+            video_ids = [item['contentDetails']['videoId'] for item in page.get('items', [])][:max_videos - seen]
+            seen += len(video_ids)
+            next_token = page.get('nextPageToken')
+            more = next_token and seen < max_videos
+            videos, page = await asyncio.gather(
+                self._get_video_details(video_ids),
+                playlist_page(next_token, max_videos - seen) if more else no_page()
+            )
+            yield videos
+
+    async def _get_video_details(self, video_ids: List[str]) -> List[Dict[str, Any]]:
+        """Fetch title, description and stats for many videos, 50 IDs per videos().list call"""
+        batches = [video_ids[start:start + MAX_RESULTS_PER_PAGE]
+                   for start in range(0, len(video_ids), MAX_RESULTS_PER_PAGE)]
+        responses = await asyncio.gather(*(
+            self._get('videos', part='snippet,statistics', id=','.join(batch))
+            for batch in batches
+        ))
+
+        videos = []
+        for video_response in responses:
+            for video_data in video_response.get('items', []):
+                statistics = video_data.get('statistics', {})
+                videos.append({
+                    'id': video_data['id'],
+                    'title': video_data['snippet']['title'],
+                    'description': video_data['snippet']['description'],
+                    'publishedAt': video_data['snippet'].get('publishedAt', ''),
+                    'views': statistics.get('viewCount', 0),
+                    'likes': statistics.get('likeCount', 0),
+                    'comments': statistics.get('commentCount', 0)
+                })
+        return videos